@@ -1,9 +1,73 @@
-import requests, random, time
+import asyncio, os, random, sqlite3, time, functools
+import aiohttp
+from urllib.parse import urlsplit
+from .retry import transient_retry
 UA_LIST = ["Mozilla/5.0 (Windows NT 10.0; Win64; x64)...", "..."]
+_HEADERS = [{"User-Agent": ua} for ua in UA_LIST]  # built once; picked per request
+TIMEOUT = aiohttp.ClientTimeout(total=15)
+CACHE_PATH = os.getenv("PAGE_CACHE_PATH", "page_cache.sqlite")
+POLITE_DELAY = 1.0  # seconds between requests to the same host
 
-def fetch_html(url: str) -> str:
-    headers = {"User-Agent": random.choice(UA_LIST)}
-    time.sleep(1)  # polite delay
-    r = requests.get(url, headers=headers, timeout=15)
-    r.raise_for_status()
-    return r.text
+_last_request_at = {}  # host -> time.monotonic() slot of its latest request
+
+_session = None
+
+def get_session() -> aiohttp.ClientSession:
+    # created lazily so it binds to the running event loop
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=20, limit_per_host=4)
+        _session = aiohttp.ClientSession(connector=connector, timeout=TIMEOUT)
+    return _session
+
+async def close_session() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+@functools.lru_cache(maxsize=1)
+def _disk():
+    # one connection for the process; all writes happen on the event loop thread
+    conn = sqlite3.connect(CACHE_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS page ("
+                 "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                 "body BLOB NOT NULL, fetched_at REAL NOT NULL)")
+    return conn
+
+async def _polite_wait(url: str) -> None:
+    # reserve this request's slot before sleeping, so concurrent fetches to
+    # one host queue up POLITE_DELAY apart instead of firing together; a host
+    # that has been idle long enough is hit straight away
+    host = urlsplit(url).netloc
+    now = time.monotonic()
+    start = max(now, _last_request_at.get(host, float("-inf")) + POLITE_DELAY)
+    _last_request_at[host] = start
+    if start > now:
+        await asyncio.sleep(start - now)
+
+@transient_retry
+async def fetch_html(url: str) -> bytes:
+    # revalidate pages seen before; a 304 carries no body, so unchanged
+    # SwimCloud profiles are served from disk instead of re-downloaded
+    cached = _disk().execute("SELECT etag, last_modified, body FROM page WHERE url = ?", (url,)).fetchone()
+    headers = random.choice(_HEADERS)
+    if cached is not None:
+        etag, last_modified, body = cached
+        headers = dict(headers)
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    await _polite_wait(url)
+    async with get_session().get(url, headers=headers) as r:
+        if r.status == 304 and cached is not None:
+            return body
+        r.raise_for_status()
+        body = await r.read()  # raw bytes; Lexbor detects the encoding itself
+        etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+    if etag or last_modified:
+        _disk().execute("INSERT OR REPLACE INTO page (url, etag, last_modified, body, fetched_at) "
+                        "VALUES (?, ?, ?, ?, ?)", (url, etag, last_modified, body, time.time()))
+    return body
@@ -1,13 +1,22 @@
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 
-def parse_swimcloud(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
-    data = {
-        "birth_year": soup.select_one(".birth-year") and
-                      soup.select_one(".birth-year").text.strip(),
-        "hometown":   soup.select_one(".hometown") and
-                      soup.select_one(".hometown").text.strip(),
-        "swim_team":  soup.select_one(".swim-team") and
-                      soup.select_one(".swim-team").text.strip()
-    }
+# css class -> output field; joined into one selector list so the tree is walked once
+FIELDS = {"birth-year": "birth_year", "hometown": "hometown", "swim-team": "swim_team"}
+SELECTOR = ", ".join(f".{cls}" for cls in FIELDS)
+
+def parse_swimcloud(html) -> dict:
+    # accepts raw bytes so the page never round-trips through a Python str
+    tree = LexborHTMLParser(html)
+    data = dict.fromkeys(FIELDS.values())
+    missing = len(data)
+    # Lexbor collects every match before returning, so the break below only
+    # skips the Python-side loop over the remaining matches, not the tree walk
+    for node in tree.css(SELECTOR):
+        for cls in (node.attributes.get("class") or "").split():
+            field = FIELDS.get(cls)
+            if field and data[field] is None:
+                data[field] = node.text(strip=True)
+                missing -= 1
+        if not missing:
+            break
     return data
@@ -0,0 +1,33 @@
+import asyncio
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+RETRY_STATUSES  = {429, 500, 502, 503, 504}
+MAX_ATTEMPTS    = 5
+MAX_RETRY_AFTER = 60  # seconds; never sleep longer than this on a server hint
+_backoff = wait_random_exponential(min=1, max=20)
+
+def _is_transient(exc):
+    # imported here so callers bringing their own predicate don't load aiohttp/openai
+    import aiohttp, openai
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status in RETRY_STATUSES
+    return isinstance(exc, (aiohttp.ClientError, asyncio.TimeoutError,
+                            openai.RateLimitError, openai.APIConnectionError,
+                            openai.InternalServerError))
+
+def _wait(retry_state):
+    # honour Retry-After (Bing 429s, Azure OpenAI rate limits) before falling back to jitter
+    exc = retry_state.outcome.exception()
+    headers = getattr(exc, "headers", None) or getattr(getattr(exc, "response", None), "headers", None)
+    retry_after = headers.get("Retry-After") if headers else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), MAX_RETRY_AFTER)
+    return _backoff(retry_state)
+
+def retry_policy(is_transient=_is_transient, attempts=MAX_ATTEMPTS):
+    # retries only exceptions is_transient accepts; anything else is raised immediately
+    return retry(retry=retry_if_exception(is_transient), wait=_wait,
+                 stop=stop_after_attempt(attempts), reraise=True)
+
+# wraps async callables; non-transient errors (e.g. 404) are raised immediately
+transient_retry = retry_policy()
@@ -1,13 +1,48 @@
+import asyncio
 from .search import web_search
-from .fetch  import fetch_html
+from .fetch  import fetch_html, close_session
 from .parser import parse_swimcloud
-from .verifier import verify
-
-def review_runner(r):
-    query = f"{r.first_name} {r.last_name} SwimCloud"
-    urls  = web_search(query)
-    if not urls:
-        return {"decision":"NO_PROFILE","confidence":0,"reasons":["no search hits"]}
-    html = fetch_html(urls[0])
-    candidate = parse_swimcloud(html)
-    return verify(r, candidate, urls[0])
+from .verifier import verify_many, close_client
+MAX_CONCURRENT_RUNNERS = 20
+CANDIDATES_PER_RUNNER  = 3  # top search hits fetched and verified per runner
+
+def _pick_verdict(verdicts):
+    accepted = [v for v in verdicts if v.get("decision") == "ACCEPT"]
+    if accepted:
+        return max(accepted, key=lambda v: v.get("confidence", 0))
+    return verdicts[0]
+
+async def review_runner(r, sem):
+    async with sem:
+        query = f"{r['first_name']} {r['last_name']} SwimCloud"
+        urls  = (await web_search(query))[:CANDIDATES_PER_RUNNER]
+        if not urls:
+            return {"decision":"NO_PROFILE","confidence":0,"reasons":["no search hits"]}
+        pages = await asyncio.gather(*[fetch_html(u) for u in urls], return_exceptions=True)
+        fetched = [(u, p) for u, p in zip(urls, pages) if not isinstance(p, Exception)]
+        if not fetched:
+            return {"decision":"NO_PROFILE","confidence":0,"reasons":["candidate pages unavailable"]}
+        # parsing is CPU-bound; keep it off the event loop
+        loop = asyncio.get_running_loop()
+        candidates = await asyncio.gather(
+            *[loop.run_in_executor(None, parse_swimcloud, p) for _, p in fetched])
+        # a candidate whose verification fails is skipped, like one whose page
+        # failed to fetch, rather than failing the whole runner
+        verdicts = await verify_many([(r, c, u) for (u, _), c in zip(fetched, candidates)])
+        verdicts = [v for v in verdicts if not isinstance(v, Exception)]
+        if not verdicts:
+            return {"decision":"NO_PROFILE","confidence":0,"reasons":["candidate verification failed"]}
+        return _pick_verdict(verdicts)
+
+async def review_runner_batch(runners, concurrency: int = MAX_CONCURRENT_RUNNERS):
+    sem = asyncio.Semaphore(concurrency)
+    try:
+        return await asyncio.gather(*[review_runner(r, sem) for r in runners],
+                                    return_exceptions=True)
+    finally:
+        await close_session()
+        await close_client()
+
+def review_runners(runners, concurrency: int = MAX_CONCURRENT_RUNNERS):
+    """runners: dicts with first_name, last_name, college_team."""
+    return asyncio.run(review_runner_batch(runners, concurrency))
@@ -1,16 +1,74 @@
-import os, requests
+import os, time, sqlite3, functools, aiohttp
+import orjson
+from collections import OrderedDict
 from urllib.parse import urlencode
-from dotenv import load_dotenv; load_dotenv()
+from dotenv import load_dotenv
+from .fetch import get_session
+from .retry import transient_retry
 
-KEY = os.getenv("AZURE_WEBSEARCH_KEY")
-ENDPOINT = os.getenv("AZURE_WEBSEARCH_ENDPOINT")
+TIMEOUT = aiohttp.ClientTimeout(total=10)
+CACHE_SIZE = 4096
+CACHE_TTL = 86400  # seconds; Bing results for a name rarely change within a day
+CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", "search_cache.sqlite")
 
-def web_search(query: str, top: int = 5):
-    params = urlencode({"q": query, "count": top})
-    url = f"{ENDPOINT}/bing/v7.0/search?{params}"
-    headers = {"Ocp-Apim-Subscription-Key": KEY}
-    r = requests.get(url, headers=headers, timeout=10)
-    r.raise_for_status()
-    return [d["url"] for d in r.json()["webPages"]["value"]]
+# in-process front cache: (query, top) -> (fetched_at, urls), oldest first
+_cache = OrderedDict()
+
+@functools.lru_cache(maxsize=1)
+def _config():
+    # read on first search rather than at import time
+    load_dotenv()
+    return os.getenv("AZURE_WEBSEARCH_KEY"), os.getenv("AZURE_WEBSEARCH_ENDPOINT")
+
+@functools.lru_cache(maxsize=1)
+def _disk():
+    # one connection for the process; all writes happen on the event loop thread
+    conn = sqlite3.connect(CACHE_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS web_search ("
+                 "query TEXT NOT NULL, top INTEGER NOT NULL, urls TEXT NOT NULL, "
+                 "fetched_at REAL NOT NULL, PRIMARY KEY (query, top))")
+    return conn
 
+def _remember(key, fetched_at, urls):
+    _cache[key] = (fetched_at, urls)
+    _cache.move_to_end(key)
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
 
+def _cache_get(key):
+    hit = _cache.get(key)
+    if hit is None:
+        row = _disk().execute("SELECT fetched_at, urls FROM web_search WHERE query = ? AND top = ?",
+                              key).fetchone()
+        if row is None:
+            return None
+        hit = (row[0], orjson.loads(row[1]))
+        _remember(key, *hit)
+    if time.time() - hit[0] > CACHE_TTL:
+        return None
+    _cache.move_to_end(key)
+    return list(hit[1])
+
+def _cache_put(key, urls):
+    fetched_at = time.time()
+    _remember(key, fetched_at, urls)
+    _disk().execute("INSERT OR REPLACE INTO web_search (query, top, urls, fetched_at) VALUES (?, ?, ?, ?)",
+                    (*key, orjson.dumps(urls).decode(), fetched_at))
+
+@transient_retry
+async def web_search(query: str, top: int = 5):
+    cache_key = (query, top)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+    api_key, endpoint = _config()
+    params = urlencode({"q": query, "count": top})
+    url = f"{endpoint}/bing/v7.0/search?{params}"
+    headers = {"Ocp-Apim-Subscription-Key": api_key}
+    async with get_session().get(url, headers=headers, timeout=TIMEOUT) as r:
+        r.raise_for_status()
+        data = await r.json()
+    urls = [d["url"] for d in data["webPages"]["value"]]
+    _cache_put(cache_key, urls)
+    return list(urls)
@@ -1,28 +1,81 @@
-import os, openai, json, textwrap
-from dotenv import load_dotenv; load_dotenv()
-openai.api_key       = os.getenv("AZURE_OPENAI_KEY")
-openai.base_url      = os.getenv("AZURE_OPENAI_ENDPOINT")
-DEPLOYMENT           = os.getenv("AZURE_OPENAI_DEPLOYMENT")
-
-def verify(runner: dict, candidate: dict, url: str) -> dict:
-    system = "You are a triathlon talent ID assistant..."
+import os, asyncio, functools, textwrap
+import orjson
+from openai import AsyncAzureOpenAI
+from dotenv import load_dotenv
+from .retry import transient_retry
+MAX_CONCURRENCY      = 8  # stay under the deployment's requests-per-minute quota
+MAX_TOKENS           = 150  # the verdict is a short JSON object
+
+# Fixed instructions; only the runner/candidate block in the user message
+# changes per call. At ~50 tokens this is far below the 1024-token minimum for
+# Azure prompt caching, so the prefix is never cached at this size.
+SYSTEM_PROMPT = textwrap.dedent("""
+    You are a triathlon talent ID assistant. You compare an NCAA runner with a
+    SwimCloud profile and decide whether they are the same person.
+    Reply with a JSON object:
+    { "decision": "ACCEPT|REJECT", "confidence": 0.0-1.0, "reasons": [...] }
+""").strip()
+
+_sem = None  # (loop, semaphore); rebuilt when a later asyncio.run brings a new loop
+
+def _semaphore() -> asyncio.Semaphore:
+    # one limit shared by every verify call on the running loop, however the
+    # calls are fanned out, so the quota holds across all runners in a batch
+    global _sem
+    loop = asyncio.get_running_loop()
+    if _sem is None or _sem[0] is not loop:
+        _sem = (loop, asyncio.Semaphore(MAX_CONCURRENCY))
+    return _sem[1]
+
+@functools.lru_cache(maxsize=1)
+def _client() -> AsyncAzureOpenAI:
+    # built on first use so importing this module needs no .env or network setup
+    load_dotenv()
+    return AsyncAzureOpenAI(
+        api_key=os.getenv("AZURE_OPENAI_KEY"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-06-01"),
+    )
+
+async def close_client() -> None:
+    # the client's httpx pool is bound to the loop it first ran on; close it
+    # before that loop ends so the next asyncio.run builds a fresh one
+    if _client.cache_info().currsize:
+        await _client().close()
+        _client.cache_clear()
+
+@transient_retry
+async def verify(runner: dict, candidate: dict, url: str) -> dict:
+    birth_year = candidate.get('birth_year')
+    hometown = candidate.get('hometown')
+    swim_team = candidate.get('swim_team')
     user = textwrap.dedent(f"""
       Runner:
         name: {runner['first_name']} {runner['last_name']}
         college_team: {runner.get('college_team')}
 
       Candidate Profile ({url}):
-        birth_year: {candidateS['birth_year']}
-        hometown: {candidate['hometown']}
-        swim_team: {candidate['swim_team']}
-
-      Are they the same person? Reply with JSON:
-      {{ "decision": "ACCEPT|REJECT", "confidence": 0.0-1.0, "reasons": [...] }}
+        birth_year: {birth_year}
+        hometown: {hometown}
+        swim_team: {swim_team}
     """)
-    resp = openai.chat.completions.create(
-        model=DEPLOYMENT,
-        messages=[{"role":"system","content":system},
-                  {"role":"user","content":user}],
-        temperature=0.2
-    )
-    return json.loads(resp.choices[0].message.content)
+    client = _client()
+    # held only for the request itself; retry backoff sleeps outside it
+    async with _semaphore():
+        resp = await client.chat.completions.create(
+            model=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+            messages=[{"role":"system","content":SYSTEM_PROMPT},
+                      {"role":"user","content":user}],
+            temperature=0.2,
+            max_tokens=MAX_TOKENS,
+            response_format={"type": "json_object"},
+        )
+    return orjson.loads(resp.choices[0].message.content)
+
+async def verify_many(pairs):
+    """pairs: iterable of (runner, candidate, url); results keep input order.
+
+    verify itself enforces MAX_CONCURRENCY; failed verifications come back
+    as exceptions in the list instead of cancelling the rest.
+    """
+    return await asyncio.gather(*[verify(*p) for p in pairs], return_exceptions=True)
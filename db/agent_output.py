@@ -0,0 +1,90 @@
+"""
+Validated AI agent output for the USA Triathlon Talent ID Pipeline.
+
+The swim-background agent answers with one JSON object per runner (see the
+system prompt in etl/ai_agent.py). AgentOutput parses and validates that
+object in one step, so a missing key or out-of-range value is rejected
+instead of being written to the runners table as NULL.
+
+The agent reports which etl/match.md criteria it found evidence for and the
+score and swimmer verdict are computed here, so scoring is deterministic and
+costs no model tokens. Answers that still carry a model-computed score and
+swimmer field (batch output, older agent versions) are accepted as-is.
+"""
+
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+# Runner columns filled from the agent's answer
+RUNNER_FIELDS = {"high_school", "hometown", "swimmer", "score", "match_confidence"}
+
+# Points per etl/match.md criterion; keep in sync with that file
+MATCH_POINTS = {
+    "name_full": 60,
+    "name_partial": 50,
+    "hometown_exact": 20,
+    "hometown_partial": 10,
+    "high_school": 15,
+    "swim_keyword": 5,
+}
+# Tiers of the same criterion are alternatives; only the best one counts
+EXCLUSIVE_CRITERIA = (("name_full", "name_partial"), ("hometown_exact", "hometown_partial"))
+SWIMMER_THRESHOLD = 75  # score must exceed this for swimmer = "Yes"
+
+MatchCriterion = Literal["name_full", "name_partial", "hometown_exact", "hometown_partial", "high_school", "swim_keyword"]
+
+
+def score_criteria(criteria: List[str]) -> int:
+    """
+    Sum the match.md points for the criteria the agent found evidence for.
+    
+    Args:
+        criteria: MATCH_POINTS keys reported by the agent
+        
+    Returns:
+        Total score from 0 to 100
+    """
+    matched = set(criteria)
+    for best, *lower in EXCLUSIVE_CRITERIA:
+        if best in matched:
+            matched.difference_update(lower)
+    return sum(MATCH_POINTS[c] for c in matched)
+
+
+class AgentRunError(RuntimeError):
+    """The agent run failed or finished without an assistant answer."""
+
+
+class AgentOutput(BaseModel):
+    """One runner's swim-background verdict as returned by the agent."""
+    
+    name: str
+    college: str
+    high_school: Optional[str] = None
+    hometown: Optional[str] = None
+    swimmer: Optional[Literal["Yes", "No", "Maybe"]] = None
+    score: Optional[int] = Field(default=None, ge=0, le=100)
+    matched_criteria: Optional[List[MatchCriterion]] = None
+    match_confidence: Literal["High", "Medium", "Low"]
+    
+    @model_validator(mode="after")
+    def _score_locally(self) -> "AgentOutput":
+        if self.matched_criteria is not None:
+            self.score = score_criteria(self.matched_criteria)
+            self.swimmer = "Yes" if self.score > SWIMMER_THRESHOLD else "No"
+        elif self.score is None or self.swimmer is None:
+            raise ValueError("agent output needs matched_criteria, or both score and swimmer")
+        return self
+    
+    def runner_update(self, runner_id: int) -> Dict:
+        """
+        Build the bulk-UPDATE row for this runner.
+        
+        Args:
+            runner_id: Primary key of the runner the answer belongs to
+            
+        Returns:
+            Dict keyed by runner_id plus the Runner columns in RUNNER_FIELDS
+        """
+        return {"runner_id": runner_id, **self.model_dump(include=RUNNER_FIELDS)}
@@ -0,0 +1,108 @@
+"""
+Checkpointing for AI agent batches.
+
+Each runner sent to the agent gets an agent_runs row that moves through
+pending -> in_flight -> succeeded, or back to pending on failure until
+MAX_AGENT_ATTEMPTS is reached and it is parked as failed (the dead-letter
+queue). Rows left in_flight by a crashed run are returned to pending at
+the start of the next one.
+"""
+
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, case, or_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from db.models import AgentRun, Runner
+
+MAX_AGENT_ATTEMPTS = 3
+MAX_ERROR_LENGTH = 1000
+
+
+def reset_in_flight(session: Session) -> int:
+    """
+    Return runners left in_flight by an interrupted run to pending.
+    
+    Returns:
+        Number of runners reset
+    """
+    result = session.execute(
+        update(AgentRun).where(AgentRun.state == "in_flight").values(state="pending")
+    )
+    session.commit()
+    return result.rowcount
+
+
+def select_pending_runners(session: Session, limit: Optional[int]) -> List:
+    """
+    Fetch runners still needing the agent, skipping those that have failed too often.
+    
+    Args:
+        session: Active session
+        limit: Maximum number of runners to return; None returns all of them
+        
+    Returns:
+        Rows of (runner_id, first_name, last_name, college_team)
+    """
+    return session.query(
+        Runner.runner_id, Runner.first_name, Runner.last_name, Runner.college_team
+    ).outerjoin(AgentRun, AgentRun.runner_id == Runner.runner_id).filter(
+        Runner.swimmer.is_(None),
+        or_(
+            AgentRun.runner_id.is_(None),
+            and_(AgentRun.state == "pending", AgentRun.attempt_count < MAX_AGENT_ATTEMPTS),
+        ),
+    ).limit(limit).all()
+
+
+def mark_in_flight(session: Session, runner_ids: List[int]) -> None:
+    """
+    Record an attempt for each runner before its agent call is made.
+    
+    Args:
+        session: Active session; committed so the checkpoint survives a crash
+        runner_ids: Runners about to be sent to the agent
+    """
+    if not runner_ids:
+        return
+    insert = pg_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    session.execute(
+        insert(AgentRun).on_conflict_do_nothing(index_elements=["runner_id"]),
+        [{"runner_id": runner_id, "state": "pending", "attempt_count": 0} for runner_id in runner_ids],
+    )
+    session.execute(
+        update(AgentRun).where(AgentRun.runner_id.in_(runner_ids)).values(
+            state="in_flight", attempt_count=AgentRun.attempt_count + 1
+        )
+    )
+    session.commit()
+
+
+def finish_agent_runs(session: Session, succeeded: List[int], failed: Dict[int, str]) -> None:
+    """
+    Close out a batch: mark successes, and requeue or park failures.
+    
+    A failed runner goes back to pending until it has used MAX_AGENT_ATTEMPTS
+    attempts, after which it is marked failed with its last error.
+    
+    Args:
+        session: Active session; committed here
+        succeeded: Runners whose agent output was stored
+        failed: Runner id -> error message for runners that did not succeed
+    """
+    if succeeded:
+        session.execute(
+            update(AgentRun).where(AgentRun.runner_id.in_(succeeded)).values(
+                state="succeeded", last_error=None
+            )
+        )
+    for runner_id, error in failed.items():
+        session.execute(
+            update(AgentRun).where(AgentRun.runner_id == runner_id).values(
+                state=case((AgentRun.attempt_count >= MAX_AGENT_ATTEMPTS, "failed"), else_="pending"),
+                last_error=error[:MAX_ERROR_LENGTH],
+            )
+        )
+    session.commit()
@@ -5,10 +5,16 @@ This module provides database connection utilities using SQLAlchemy
 with SQLite, including session management.
 """
 
+import logging
 import os
-from typing import Optional
-
-from sqlalchemy import create_engine, Engine
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import orjson
+from sqlalchemy import create_engine, event, Engine
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
@@ -16,27 +22,89 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///C:/Users/jhigh/OneDrive/Personal Projects/Databases/tri_talent.db")
 
-# Connection pool configuration
-POOL_SIZE = 10
-MAX_OVERFLOW = 20
-POOL_TIMEOUT = 30
+# Connection pool configuration - size the pool to the pipeline's concurrency
+# and hard-cap it (no overflow) rather than oversubscribing the database
+POOL_SIZE = int(os.getenv("POOL_SIZE", "25"))
+MAX_OVERFLOW = int(os.getenv("MAX_OVERFLOW", "0"))
+POOL_TIMEOUT = int(os.getenv("POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("POOL_RECYCLE", "1800"))  # Seconds; for long-running workers
+
+# Applied to every new SQLite connection: WAL lets readers run alongside the
+# single writer, and the cache/mmap settings keep hot pages in memory.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Configure a freshly opened SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def _json_dumps(value: Any) -> str:
+    """Serialize JSON columns such as Runner.raw_data with orjson."""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def _warn_if_pool_saturated(pool: QueuePool) -> None:
+    """Log when every pooled connection is checked out."""
+    checked_out = pool.checkedout()
+    if checked_out >= POOL_SIZE + MAX_OVERFLOW:
+        logger.warning(f"Connection pool saturated ({checked_out} checked out); consider raising POOL_SIZE")
 
 
 def create_db_engine() -> Engine:
     """
-    Create a SQLAlchemy engine for SQLite.
+    Create a SQLAlchemy engine for the configured database.
+    
+    SQLite connections may be shared across threads and wait up to 30s on
+    a locked database instead of failing immediately. In-memory SQLite keeps
+    SQLAlchemy's single-connection pool; everything else gets a QueuePool.
+    JSON columns are encoded and decoded with orjson on both backends.
     
     Returns:
         Engine: Configured SQLAlchemy engine
     """
+    is_sqlite = DATABASE_URL.startswith("sqlite")
+    is_memory = is_sqlite and (DATABASE_URL == "sqlite://" or ":memory:" in DATABASE_URL)
+    connect_args = {"check_same_thread": False, "timeout": 30} if is_sqlite else {}
+    pool_args = {} if is_memory else {
+        "poolclass": QueuePool,
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_use_lifo": True,  # Let idle connections age out under low load
+        # A server may drop connections that sat idle through a long agent
+        # run; test them on checkout instead of failing the next statement
+        "pool_pre_ping": not is_sqlite,
+    }
     engine = create_engine(
         DATABASE_URL,
-        echo=False  # Set to True for SQL query logging
+        connect_args=connect_args,
+        json_serializer=_json_dumps,
+        json_deserializer=orjson.loads,
+        echo=False,  # Set to True for SQL query logging
+        **pool_args
     )
-    return engine
+    if is_sqlite:
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    if pool_args:
+        event.listen(engine, "checkout", lambda *args: _warn_if_pool_saturated(engine.pool))
     return engine
 
 
@@ -45,13 +113,13 @@ def get_session_factory(engine: Optional[Engine] = None) -> sessionmaker:
     Create a session factory for database operations.
     
     Args:
-        engine: Optional SQLAlchemy engine. If None, creates a new one.
+        engine: Optional SQLAlchemy engine. If None, uses the global engine.
         
     Returns:
         sessionmaker: Session factory for creating database sessions
     """
     if engine is None:
-        engine = create_db_engine()
+        engine = get_engine()
         
     return sessionmaker(bind=engine, expire_on_commit=False)
 
@@ -81,8 +149,57 @@ def get_db_session() -> Session:
 get_session = get_db_session
 
 
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """
+    Provide one session for a unit of work, committing on success.
+    
+    Open it once per run (or per worker) and pass the session down, rather
+    than having each helper check out and close its own connection.
+    
+    Usage:
+        with session_scope() as session:
+            # Database operations
+    """
+    session = get_db_session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def bulk_upsert(session: Session, model, rows: List[Dict], index_elements: List[str]) -> None:
+    """
+    Insert many rows in one executemany, updating rows that already exist.
+    
+    Bypasses the ORM unit of work: no objects are constructed and Python-side
+    column defaults are not applied, so callers must supply values such as
+    timestamps themselves. Rows must not repeat the same conflict key.
+    
+    Args:
+        session: Active session; the caller commits
+        model: Mapped class to insert into
+        rows: Dicts keyed by attribute name, all with the same keys
+        index_elements: Columns of the unique constraint that defines a conflict
+    """
+    if not rows:
+        return
+    insert = pg_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={key: stmt.excluded[key] for key in rows[0] if key not in index_elements},
+    )
+    session.execute(stmt, rows)
+
+
 # Global engine instance (created lazily)
 _engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
 
 
 def get_engine() -> Engine:
@@ -92,8 +209,9 @@ def get_engine() -> Engine:
     Returns:
         Engine: Global SQLAlchemy engine
     """
-    print("DATABASE_URL:", DATABASE_URL)
     global _engine
     if _engine is None:
-        _engine = create_db_engine()
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_db_engine()
     return _engine
@@ -8,16 +8,19 @@ Entity Relationship Overview:
 - Runner: NCAA track athletes scraped from TFRRS
 - TimeStandard: USA Triathlon performance benchmarks
 - Classification: Performance classification results against standards
+- AgentRun: Per-runner checkpoint for the AI agent batch (state, attempts, last error)
 
 Database Design Notes:
-- All times stored as DECIMAL seconds for precision
-- Names normalized to lowercase for consistent matching
+- All times stored as INTEGER hundredths of a second (58.23s -> 5823) in
+  columns suffixed _cs, so comparisons stay native integer compares and reads
+  never build Decimals; see the README for converting older databases
+- Names normalized to lowercase for consistent matching; name lookups compare
+  lower(name) so they stay sargable through the idx_runner_name_lc expression index
 - Timestamps track data freshness for cache invalidation
 - JSONB fields store raw scraped data for debugging/re-processing
 """
 
 from datetime import datetime
-from decimal import Decimal
 from typing import List, Optional
 import os
 
@@ -32,22 +35,19 @@ from sqlalchemy.sql import func
 
 Base = declarative_base()
 
-# Database-agnostic JSON type
+# Database-agnostic column types, resolved once at import
+_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///C:/Users/jhigh/OneDrive/Personal Projects/Databases/tri_talent.db")
+_IS_POSTGRES = _DATABASE_URL.startswith("postgresql")
+JSON_TYPE = JSONB if _IS_POSTGRES else JSON
+ARRAY_TYPE = ARRAY(String) if _IS_POSTGRES else JSON  # Store arrays as JSON in SQLite
+
 def get_json_type():
     """Return appropriate JSON type based on database URL."""
-    database_url = os.getenv("DATABASE_URL", "sqlite:///C:/Users/jhigh/OneDrive/Personal Projects/Databases/tri_talent.db")
-    if database_url.startswith("postgresql"):
-        return JSONB
-    else:
-        return JSON
+    return JSON_TYPE
 
 def get_array_type():
     """Return appropriate array type based on database URL."""
-    database_url = os.getenv("DATABASE_URL", "sqlite:///C:/Users/jhigh/OneDrive/Personal Projects/Databases/tri_talent.db")
-    if database_url.startswith("postgresql"):
-        return ARRAY(String)
-    else:
-        return JSON  # Store arrays as JSON in SQLite
+    return ARRAY_TYPE
 
 
 class Runner(Base):
@@ -63,13 +63,13 @@ class Runner(Base):
     runner_id = Column(Integer, primary_key=True, autoincrement=True)
     
     # Athlete identification (normalized for matching)
-    first_name = Column(String(100), nullable=False, index=True)
+    first_name = Column(String(100), nullable=False)  # Leading column of uq_runner_identity
     last_name = Column(String(100), nullable=False, index=True)
     
     # Performance data
     college_team = Column(String(200), nullable=False)
     event = Column(String(50), nullable=False)  # e.g., "800m_outdoor", "Mile_indoor"
-    performance_time = Column(DECIMAL(8, 2), nullable=False)  # Seconds with 2 decimal precision
+    performance_time_cs = Column(Integer, nullable=False)  # Hundredths of a second
     year = Column(Integer, nullable=False)
     gender = Column(String(1), nullable=False)  # 'M' or 'F'
     
@@ -86,19 +86,35 @@ class Runner(Base):
     
     # Metadata
     scrape_timestamp = Column(DateTime, nullable=False, default=func.now())
-    raw_data = Column(get_json_type())  # Store original scraped HTML/data for debugging
+    raw_data = Column(JSON_TYPE)  # Store original scraped HTML/data for debugging
     
     # Constraints
     __table_args__ = (
         CheckConstraint("gender IN ('M', 'F')", name="valid_gender"),
-        CheckConstraint("performance_time > 0", name="positive_time"),
-        CheckConstraint("year >= 2000 AND year <= 2030", name="valid_year"),
-        Index("idx_runner_name", "last_name", "first_name"),
+        CheckConstraint("performance_time_cs > 0", name="positive_time"),
+        CheckConstraint("year >= 2000", name="valid_year"),
+        Index("idx_runner_name_lc", func.lower(last_name), func.lower(first_name)),
         Index("idx_runner_event_year", "event", "year"),
         Index("idx_runner_team", "college_team"),
+        # Partial index over runners still awaiting the AI agent; it shrinks as
+        # batches drain, keeping the pending-runner fetch an index scan
+        Index(
+            "idx_runner_swimmer_pending", "runner_id",
+            postgresql_where=swimmer.is_(None), sqlite_where=swimmer.is_(None),
+        ),
+        # Containment (@>) lookups on the raw scrape payload; PostgreSQL/JSONB only
+        Index(
+            "idx_runner_raw_data_gin", "raw_data",
+            postgresql_using="gin", postgresql_ops={"raw_data": "jsonb_path_ops"},
+        ).ddl_if(dialect="postgresql"),
         UniqueConstraint('first_name', 'last_name', name='uq_runner_identity'),
     )
     
+    @property
+    def performance_seconds(self) -> float:
+        """Performance time in seconds."""
+        return self.performance_time_cs / 100
+
     def __repr__(self) -> str:
         return f"<Runner(id={self.runner_id}, name='{self.first_name} {self.last_name}', event='{self.event}')>"
 
@@ -122,7 +138,7 @@ class TimeStandard(Base):
     category = Column(String(50), nullable=False)  # "World Leading", "Internationally Ranked", etc.
     
     # Performance threshold
-    cutoff_seconds = Column(DECIMAL(8, 2), nullable=False)
+    cutoff_cs = Column(Integer, nullable=False)  # Hundredths of a second
     
     # Metadata for reporting
     color_code = Column(String(20))  # "Dark_Green", "Green", "Yellow", "Red"
@@ -134,11 +150,16 @@ class TimeStandard(Base):
     # Constraints
     __table_args__ = (
         CheckConstraint("gender IN ('M', 'F')", name="valid_standard_gender"),
-        CheckConstraint("cutoff_seconds > 0", name="positive_cutoff"),
+        CheckConstraint("cutoff_cs > 0", name="positive_cutoff"),
         UniqueConstraint("gender", "age_group", "event", "category", name="unique_standard"),
         Index("idx_standard_lookup", "gender", "event", "category"),
     )
     
+    @property
+    def cutoff_seconds(self) -> float:
+        """Cutoff time in seconds."""
+        return self.cutoff_cs / 100
+
     def __repr__(self) -> str:
         return f"<TimeStandard(id={self.standard_id}, event='{self.event}', category='{self.category}')>"
 
@@ -160,13 +181,13 @@ class Classification(Base):
     
     # Classification results
     event_classified = Column(String(100), nullable=False)  # Which swimming event was classified
-    athlete_time = Column(DECIMAL(8, 2), nullable=False)  # Athlete's actual time in seconds
-    standard_time = Column(DECIMAL(8, 2), nullable=False)  # Standard cutoff time
+    athlete_time_cs = Column(Integer, nullable=False)  # Athlete's actual time, hundredths of a second
+    standard_time_cs = Column(Integer, nullable=False)  # Standard cutoff time, hundredths of a second
     category_assigned = Column(String(50), nullable=False)  # "World Leading", etc.
     color_label = Column(String(20), nullable=False)  # "Dark_Green", "Green", "Yellow", "Red"
     
     # Performance analysis
-    time_differential = Column(DECIMAL(8, 2))  # How much faster/slower than standard
+    time_differential_cs = Column(Integer)  # How much faster/slower than standard, hundredths of a second
     percentile_rank = Column(DECIMAL(5, 2))  # Optional: rank within category
     
     # Metadata
@@ -177,11 +198,45 @@ class Classification(Base):
     
     # Constraints
     __table_args__ = (
-        CheckConstraint("athlete_time > 0", name="positive_athlete_time"),
-        CheckConstraint("standard_time > 0", name="positive_standard_time"),
+        CheckConstraint("athlete_time_cs > 0", name="positive_athlete_time"),
+        CheckConstraint("standard_time_cs > 0", name="positive_standard_time"),
         Index("idx_classification_category", "category_assigned"),
         Index("idx_classification_event", "event_classified"),
     )
     
     def __repr__(self) -> str:
         return f"<Classification(id={self.class_id}, category='{self.category_assigned}', event='{self.event_classified}')>"
+
+
+class AgentRun(Base):
+    """
+    Checkpoint for AI agent processing of a single runner.
+    
+    Records which runners have been attempted, how often, and why the last
+    attempt failed, so an interrupted or failing batch can resume without
+    re-spending agent calls on runners that keep failing. Runners with state
+    'failed' form the dead-letter queue for manual follow-up.
+    """
+    __tablename__ = "agent_runs"
+    
+    # One checkpoint row per runner
+    runner_id = Column(Integer, ForeignKey("runners.runner_id", ondelete="CASCADE"), primary_key=True)
+    
+    # Processing state
+    state = Column(String(20), nullable=False, default="pending")  # "pending", "in_flight", "succeeded", "failed"
+    attempt_count = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    
+    # Metadata
+    updated_at = Column(DateTime, nullable=False, default=func.now(), onupdate=func.now())
+    
+    # Constraints
+    __table_args__ = (
+        CheckConstraint(
+            "state IN ('pending', 'in_flight', 'succeeded', 'failed')", name="valid_agent_run_state"
+        ),
+        Index("idx_agent_run_state", "state"),
+    )
+    
+    def __repr__(self) -> str:
+        return f"<AgentRun(runner_id={self.runner_id}, state='{self.state}', attempts={self.attempt_count})>"
@@ -0,0 +1,111 @@
+"""
+Helpers shared by the agent scripts (etl/ai_agent.py and etl/use_agent.py).
+
+Run those scripts from the repo root with `python -m etl.ai_agent` or
+`python -m etl.use_agent` so the db, etl and ai_agent packages resolve.
+"""
+
+import os
+from typing import TYPE_CHECKING, List
+
+import orjson
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from ai_agent.retry import RETRY_STATUSES, retry_policy
+from db.agent_output import AgentOutput
+from db.db_connection import get_db_session
+from db.models import Runner
+
+if TYPE_CHECKING:
+    from azure.identity import ChainedTokenCredential
+
+
+def print_db_target() -> None:
+    print(f"DATABASE_URL: {os.getenv('DATABASE_URL')}")
+    session = get_db_session()
+    engine = session.get_bind()
+    if engine.dialect.name == "sqlite":
+        print(f"Connected SQLite DB file: {engine.url.database}")
+    session.close()
+
+
+def _is_transient(exc: BaseException) -> bool:
+    from azure.core.exceptions import HttpResponseError, ServiceRequestError
+    if isinstance(exc, HttpResponseError):
+        return exc.status_code in RETRY_STATUSES
+    return isinstance(exc, ServiceRequestError)
+
+def azure_credential(aio: bool = False) -> "ChainedTokenCredential":
+    # Only the two sources this pipeline signs in with: a service principal
+    # from the AZURE_* environment variables, else the developer's `az login`.
+    # DefaultAzureCredential would first probe managed identity (an IMDS
+    # request that can hang off Azure), VS Code, PowerShell and others.
+    # aio=True returns the asyncio flavour from azure.identity.aio.
+    if aio:
+        from azure.identity.aio import AzureCliCredential, ChainedTokenCredential, EnvironmentCredential
+    else:
+        from azure.identity import AzureCliCredential, ChainedTokenCredential, EnvironmentCredential
+    return ChainedTokenCredential(EnvironmentCredential(), AzureCliCredential())
+
+# Retry agent calls only on throttling and transient Azure errors, with the
+# Retry-After handling and attempt budget of ai_agent/retry.py
+agent_retry = retry_policy(_is_transient)
+
+
+def bulk_update_runners(session: Session, rows: List[dict]) -> bool:
+    """
+    Write agent output for many runners in one executemany UPDATE and commit once.
+
+    Args:
+        rows (List[dict]): AgentOutput.runner_update() dicts, keyed by runner_id.
+
+    Returns:
+        bool: False if the update failed and was rolled back.
+    """
+    if not rows:
+        return True
+    try:
+        session.execute(update(Runner), rows)
+        session.commit()
+        print(f"Updated {len(rows)} runner(s) with agent output.")
+        return True
+    except Exception as e:
+        session.rollback()
+        print(f"Error updating runners: {e}")
+        return False
+
+
+def training_example(system_prompt: str, user_message: str, assistant_response: AgentOutput) -> dict:
+    """
+    Build a training example in the required structure.
+    """
+    # Format the assistant's response as a readable string
+    response_lines = [
+        f"Name: {assistant_response.name}",
+        f"College: {assistant_response.college}",
+        f"High School: {assistant_response.high_school}",
+        f"Hometown: {assistant_response.hometown}",
+        f"Swimmer: {assistant_response.swimmer}",
+        f"Score: {assistant_response.score}",
+        f"Match Confidence: {assistant_response.match_confidence}"
+    ]
+    assistant_content = "\n" + "\n".join(response_lines)
+    return {
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": assistant_content}
+        ]
+    }
+
+
+def append_training_examples(entries: List[dict], jsonl_path: str = "etl/data/training_data.jsonl") -> None:
+    """
+    Append a batch of training examples to the JSONL file with a single open and write.
+    """
+    if not entries:
+        return
+    with open(jsonl_path, "ab") as f:
+        f.write(b"".join(orjson.dumps(entry) + b"\n" for entry in entries))
@@ -1,226 +1,149 @@
+import argparse
 import os
 import sys
-import json
+import orjson
 import time
+import functools
 from pathlib import Path
-from db.db_connection import get_db_session
-from db.models import Runner
+from db.db_connection import session_scope
+from db.agent_runs import finish_agent_runs, mark_in_flight, reset_in_flight, select_pending_runners
+from db.agent_output import AgentOutput, AgentRunError
+from etl.agent_common import (
+    agent_retry, append_training_examples, azure_credential, bulk_update_runners, print_db_target, training_example,
+)
 
-from typing import List, Any
+from typing import TYPE_CHECKING, Dict, List, Any, Optional
 
-from opentelemetry import trace
 #from azure.monitor.opentelemetry import configure_azure_monitor
-from azure.ai.projects import AIProjectClient
-from azure.identity import DefaultAzureCredential
-from azure.ai.agents.models import (
-    BingGroundingTool,
-    FilePurpose,
-    FileSearchTool,
-    ToolSet,
-)
+
+# The Azure and OpenAI SDKs are imported inside the functions that use them,
+# so `--help` and the DB-only code paths start without loading them
+if TYPE_CHECKING:
+    from azure.ai.agents.models import ToolSet
+    from azure.ai.projects import AIProjectClient
+    from openai import AzureOpenAI
 
 sys.path.append(str(Path(__file__).parent.parent))
-print(f"DATABASE_URL: {os.getenv('DATABASE_URL')}")
 
-from sqlalchemy import inspect
-session = get_db_session()
-engine = session.get_bind()
-if engine.dialect.name == "sqlite":
-    print(f"Connected SQLite DB file: {engine.url.database}")
-session.close()
+from sqlalchemy.orm import Session
 
-def use_agent(runner_id: id) -> str:
+@functools.lru_cache(maxsize=1)
+def _project_client() -> "AIProjectClient":
+    # One credential and client for the whole run, so the AAD token and the
+    # HTTPS connection are reused across runners instead of rebuilt per call
+    from azure.ai.projects import AIProjectClient
     project_endpoint = os.environ["PROJECT_ENDPOINT"]  # Ensure the PROJECT_ENDPOINT environment variable is set
-
-    # Create an AIProjectClient instance
-    project_client = AIProjectClient(
+    return AIProjectClient(
         endpoint=project_endpoint,
-        credential=DefaultAzureCredential(),  # Use Azure Default Credential for authentication
+        credential=azure_credential(),
     )
 
-    with project_client: 
-        bing_connection = project_client.connections.get(os.environ["BING_CONNECTION_NAME"])
-        conn_id = bing_connection.id
-        bing_tool = BingGroundingTool(connection_id=conn_id)
-        print(conn_id)
-
-        file_path = "./etl/match.md"
-
-        file = project_client.agents.files.upload_and_poll(file_path=file_path, purpose=FilePurpose.AGENTS)
-        print(f"Uploaded file, file ID: {file.id}")
-
-        vector_store = project_client.agents.vector_stores.create_and_poll(file_ids=[file.id], name="my_vectorstore")
-        print(f"Created vector store, vector store ID: {vector_store.id}")
-        file_search = FileSearchTool(vector_store_ids=[vector_store.id])
-
-        toolset = ToolSet()
-        toolset.add(bing_tool)
-        toolset.add(file_search)
-
-        system_prompt = (
-            """
-            Determine if a given NCAA runner has a previous swimming background.
-                Given a runner's profile: first name, last name, college team.
-                1. Build a query: 'name' + 'college team' + 'track and field'. Find runner's college profile using Bing Search. 
-                2. Create the query: 'name' + 'hometown' + 'SwimCloud'. 
-                3. Search for possible matches on SwimCloud, a public swimming results website.
-                4. Use file search and the match.md file to calculate a match score for the runner. You must use the point values and criteria exactly as described in match.md. For each match, add up the points only from the criteria that are explicitly met. Do not round up, estimate, or invent new scoring rules.
-                5. Respond ONLY with a valid JSON object:
-                    {
-                    "name": ...,
-                    "college": ...,
-                    "high_school": ...,
-                    "hometown": ...,
-                    "swimmer": ...,
-                    "score": ...,
-                    "match_confidence": ...
-                    }
-                    No extra text or formatting.
-
-                    Example:
-                    Input: Christian Jackson, Virginia Tech
-                    Output:
-                    {"name": "Christian Jackson", "college": "Virginia Tech", "high_school": "Colonial Forge", "hometown": "Stafford, VA", "swimmer": "No", "score": 60, "match_confidence": "High"}
-        """)
-
-        
-    
-        
-        agent = project_client.agents.create_agent(
-            name = "ValidateSwimBackground",
-            model = "gpt-4.1",
-            instructions= system_prompt,
-            temperature= 0.1,
-            toolset=toolset,
-        )
-
-        #project_client.agents.enable_auto_function_calls(toolset)
-
-        # Create a new thread for the agent interaction
-        thread = project_client.agents.threads.create(tool_resources=file_search.resources)
-
-        session = get_db_session()
-        runner = session.query(Runner).filter(Runner.runner_id == runner_id).first()
-        runner_info = f"{runner.first_name} {runner.last_name}, {runner.college_team}"
-
-        # Create a user message with the runner information
-        message = project_client.agents.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=runner_info,
-        )
-        
-        # Run the agent with the created thread
-        run = project_client.agents.runs.create_and_process(thread_id=thread.id, agent_id=agent.id)
-
-        # Check if the run was successful
-        if run.status == "failed":
-            return f"Run failed: {run.last_error}"
-        
-        # Fetch and return the assistant's response
-        messages = project_client.agents.messages.list(thread_id=thread.id)
-
-        #response_message = project_client.messages.get_last_message_by_role(thread_id=thread.id, role="assistant")
-        for message in messages:
-            if message.role == "assistant":
-                #print(f"Assistant response: {message.content[0]['text']['value']}")
-                response = json.loads(message.content[0]['text']['value'])
-                #project_client.agents.threads.delete(thread_id=thread.id)
-                return response
-        
-        #project_client.agents.threads.delete(thread_id=thread.id)
-        return "No assistant response found."
-
-def get_next_runner_id() -> int:
+# Agent instructions; identical for every runner, so they are sent once with
+# the agent definition rather than rebuilt per call
+AGENT_INSTRUCTIONS = (
     """
-    Fetch the next runner from the database that needs AI processing.
-    
-    This function should connect to your database and retrieve a runner
-    that has not yet been processed by the AI agent.
-    
-    Returns:
-        str: A string containing the runner's information.
+        Determine if a given NCAA runner has a previous swimming background.
+            Given a runner's profile: first name, last name, college team.
+            1. In your first response, emit both Bing Search tool calls together (parallel tool calls) before any reasoning:
+               'name' + 'college team' + 'track and field' to find the runner's college profile, and
+               'name' + 'SwimCloud' to find possible matches on SwimCloud, a public swimming results website.
+            2. Only if the college profile lists a hometown and the SwimCloud results are ambiguous, search 'name' + 'hometown' + 'SwimCloud'.
+            3. After the searches return, compare the SwimCloud candidates against the college profile.
+            4. For the best SwimCloud candidate, list every criterion below that is explicitly met. Do not guess or add criteria; the score is computed from this list.
+                - "name_full": all words of the runner's name appear on the SwimCloud page
+                - "name_partial": only some words of the runner's name appear on the SwimCloud page
+                - "hometown_exact": the runner's hometown closely matches the candidate's hometown
+                - "hometown_partial": only the city or the state of the runner's hometown matches
+                - "high_school": the runner's high school appears in the candidate's high school field
+                - "swim_keyword": the candidate's bio or news mentions swim, swimming, freestyle, backstroke, breaststroke, butterfly or IM
+               Use an empty list if no SwimCloud profile was found.
+            5. Set match_confidence from the quality of the evidence, not the number of criteria: "High" for strong, direct evidence (or clear evidence there is no swimming background), "Medium" for partial evidence, "Low" for weak or missing data.
+            6. Respond ONLY with a valid JSON object:
+                {
+                "name": ...,
+                "college": ...,
+                "high_school": ...,
+                "hometown": ...,
+                "matched_criteria": [...],
+                "match_confidence": ...
+                }
+                No extra text or formatting.
+
+                Example:
+                Input: Christian Jackson, Virginia Tech
+                Output:
+                {"name": "Christian Jackson", "college": "Virginia Tech", "high_school": "Colonial Forge", "hometown": "Stafford, VA", "matched_criteria": ["name_full"], "match_confidence": "High"}
+    """)
+
+@functools.lru_cache(maxsize=1)
+def _agent_tools() -> "ToolSet":
     """
-    session = get_db_session()
-    runner = session.query(Runner).filter(Runner.swimmer == None).first()
-    if runner:
-        return runner.runner_id
-    return -1
+    Build the Bing grounding toolset once per run.
 
-def build_user_query(runner_id: int) -> str:
+    Scoring against etl/match.md happens locally in AgentOutput, so the
+    agent needs no file-search tool or vector store.
     """
-    Build a user query string for the AI agent based on the runner's information.
+    from azure.ai.agents.models import BingGroundingTool, ToolSet
+    project_client = _project_client()
 
-    Args:
-        runner_id (int): The ID of the runner.
+    bing_connection = project_client.connections.get(os.environ["BING_CONNECTION_NAME"])
+    conn_id = bing_connection.id
+    bing_tool = BingGroundingTool(connection_id=conn_id)
+    print(conn_id)
 
-    Returns:
-        str: A formatted string containing the runner's information.
-    """
-    session = get_db_session()
-    runner = session.query(Runner).filter(Runner.id == runner_id).first()
-    if runner:
-        return f"{runner.first_name} {runner.last_name}, College: {runner.college_team}"
-    return "Runner not found."
+    toolset = ToolSet()
+    toolset.add(bing_tool)
+    return toolset
 
-def update_runner_with_agent_output(runner_id: int, agent_output: dict) -> None:
-    """
-    Update the runner's record in the database with AI agent output.
+@functools.lru_cache(maxsize=1)
+def _agent():
+    # The definition is identical for every runner, so create it once and
+    # start each runner's thread against the same agent id
+    toolset = _agent_tools()
+    return _project_client().agents.create_agent(
+        name = "ValidateSwimBackground",
+        model = "gpt-4.1",
+        instructions= AGENT_INSTRUCTIONS,
+        temperature= 0.1,
+        toolset=toolset,
+    )
 
-    Args:
-        agent_output (dict): Dictionary with keys: name, college, class, high_school, hometown, swimmer, score, match_confidence.
-    """
-    session = get_db_session()
-    try:
-        # Find the runner by id
-        runner = session.query(Runner).filter(
-            Runner.runner_id == runner_id,
-        ).first()
-        if not runner:
-            print(f"No runner found for ID {runner_id}")
-            return
-        runner.high_school = agent_output.get("high_school")
-        runner.hometown = agent_output.get("hometown")
-        runner.swimmer = agent_output.get("swimmer")
-        runner.score = agent_output.get("score")
-        runner.match_confidence = agent_output.get("match_confidence")
-        session.commit()
-        print(f"Runner {runner.runner_id} updated with agent output.")
-    except Exception as e:
-        session.rollback()
-        print(f"Error updating runner: {e}")
-    finally:
-        session.close()
+@agent_retry
+def use_agent(runner_info: str) -> AgentOutput:
+    from azure.ai.agents.models import AgentThreadCreationOptions, ThreadMessageOptions
+    project_client = _project_client()
+    agent = _agent()
+
+    #project_client.agents.enable_auto_function_calls(toolset)
+
+    # Create the thread, post the runner message and run the agent in one
+    # request instead of separate thread/message/run calls
+    run = project_client.agents.create_thread_and_process_run(
+        agent_id=agent.id,
+        thread=AgentThreadCreationOptions(
+            messages=[ThreadMessageOptions(role="user", content=runner_info)],
+        ),
+        parallel_tool_calls=True,
+    )
+
+    # Check if the run was successful
+    if run.status == "failed":
+        raise AgentRunError(f"Run failed: {run.last_error}")
     
+    # Fetch and return the assistant's response
+    messages = project_client.agents.messages.list(thread_id=run.thread_id)
 
-def append_training_example(system_prompt: str, user_message: str, assistant_response: dict, jsonl_path: str = "etl/data/training_data.jsonl") -> None:
-    """
-    Append a training example to the JSONL file in the required structure.
-    """
-    # Format the assistant's response as a readable string
-    response_lines = [
-        f"Name: {assistant_response.get('name', '')}",
-        f"College: {assistant_response.get('college', '')}",
-        f"High School: {assistant_response.get('high_school', '')}",
-        f"Hometown: {assistant_response.get('hometown', '')}",
-        f"Swimmer: {assistant_response.get('swimmer', '')}",
-        f"Score: {assistant_response.get('score', '')}",
-        f"Match Confidence: {assistant_response.get('match_confidence', '')}"
-    ]
-    assistant_content = "\n" + "\n".join(response_lines)
-    entry = {
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message},
-            {"role": "assistant", "content": assistant_content}
-        ]
-    }
-    with open(jsonl_path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    #response_message = project_client.messages.get_last_message_by_role(thread_id=thread.id, role="assistant")
+    # Stop at the first assistant message instead of walking the whole thread
+    message = next((m for m in messages if m.role == "assistant"), None)
+    if message is None:
+        raise AgentRunError("No assistant response found.")
+    # Parse and validate in one pass; a malformed answer raises ValidationError
+    return AgentOutput.model_validate_json(message.content[0]['text']['value'])
 
-def main():
-    system_prompt = (
-        """Determine if a given NCAA runner has a previous swimming background.
+# Chat-completions prompt for the main loop and the Batch API path
+SYSTEM_PROMPT = (
+    """Determine if a given NCAA runner has a previous swimming background.
         Given a runner's profile: first name, last name, college team.
         1. Build a query: 'name' + 'college team' + 'track and field'. Find runner's college profile. 
         2. Create the query: 'name' + 'hometown' + 'SwimCloud'.
@@ -243,34 +166,172 @@ def main():
         Output:
         {"name": "Christian Jackson", "college": "Virginia Tech", "high_school": "Colonial Forge", "hometown": "Stafford, VA", "swimmer": "No", "score": 50, "match_confidence": "High"}
     """)
+
+# Azure OpenAI Batch API settings (--batch mode)
+BATCH_MODEL = os.getenv("AZURE_OPENAI_BATCH_DEPLOYMENT", "gpt-4.1-2")
+BATCH_INPUT_PATH = "etl/data/batch_processing.jsonl"
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+BATCH_POLL_INITIAL = 30  # seconds
+BATCH_POLL_MAX = 600  # seconds
+
+DEFAULT_MAX_BATCH = 2  # runners per live agent run when --max-batch is not given
+
+
+@functools.lru_cache(maxsize=1)
+def _openai_client() -> "AzureOpenAI":
+    from openai import AzureOpenAI
+    return AzureOpenAI(
+        api_key=os.getenv("AZURE_OPENAI_KEY"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-10-21"),
+    )
+
+def write_batch_file(runners: List[Any], path: str = BATCH_INPUT_PATH) -> None:
+    """
+    Write one chat-completions request per runner, keyed by runner_id.
+
+    Args:
+        runners: Rows with runner_id, first_name, last_name and college_team.
+    """
+    with open(path, "wb") as f:
+        for runner in runners:
+            entry = {
+                "custom_id": str(runner.runner_id),
+                "method": "POST",
+                "url": "/chat/completions",
+                "body": {
+                    "model": BATCH_MODEL,
+                    "messages": [
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": f"{runner.first_name} {runner.last_name}, {runner.college_team}"}
+                    ]
+                }
+            }
+            f.write(orjson.dumps(entry) + b"\n")
+
+def run_batch(path: str = BATCH_INPUT_PATH) -> Any:
+    """
+    Upload the batch file, submit it as one job and poll until it finishes.
+
+    Returns:
+        The final batch object; check its status before reading output.
+    """
+    client = _openai_client()
+    with open(path, "rb") as f:
+        batch_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/chat/completions",
+        completion_window="24h",
+    )
+    print(f"Submitted batch {batch.id}")
+    delay = BATCH_POLL_INITIAL
+    while batch.status not in BATCH_TERMINAL_STATUSES:
+        time.sleep(delay)
+        delay = min(delay * 2, BATCH_POLL_MAX)
+        batch = client.batches.retrieve(batch.id)
+        print(f"Batch {batch.id}: {batch.status}")
+    return batch
+
+def apply_batch_output(session: Session, output: str) -> int:
+    """
+    Write every successful batch response onto its runner in one executemany.
+
+    Returns:
+        Number of runners updated; 0 if the update failed and was rolled back.
+    """
+    updates = []
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        try:
+            result = orjson.loads(line)
+            agent_output = AgentOutput.model_validate_json(result["response"]["body"]["choices"][0]["message"]["content"])
+            updates.append(agent_output.runner_update(int(result["custom_id"])))
+        except (KeyError, IndexError, TypeError, ValueError) as e:  # ValidationError is a ValueError
+            print(f"Skipping unreadable batch result: {e}")
+    if not bulk_update_runners(session, updates):
+        return 0
+    return len(updates)
+
+def main_batch(max_batch: Optional[int]) -> None:
+    """
+    Process pending runners through the Azure OpenAI Batch API in one job.
+
+    Args:
+        max_batch: Maximum number of runners to submit; None submits every pending runner.
+    """
+    # Read the runners and release the connection before the job runs; the
+    # poll can take up to 24h and must not hold a transaction open meanwhile
+    with session_scope() as session:
+        runners = select_pending_runners(session, max_batch)
+    if not runners:
+        print("No runners to process. Exiting.")
+        return
+    write_batch_file(runners)
+    print(f"Wrote {len(runners)} tasks to {BATCH_INPUT_PATH}")
+    batch = run_batch()
+    if batch.status != "completed" or not batch.output_file_id:
+        print(f"Batch {batch.id} ended with status {batch.status}")
+        return
+    output = _openai_client().files.content(batch.output_file_id).text
+    with session_scope() as session:
+        updated = apply_batch_output(session, output)
+    print(f"Batch complete. Updated {updated} of {len(runners)} runner(s).")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check pending runners for a swimming background")
+    parser.add_argument("--batch", action="store_true", help="Submit all pending runners as one Azure OpenAI batch job")
+    parser.add_argument("--max-batch", type=int, default=None,
+                        help=f"Maximum number of runners to process (default: {DEFAULT_MAX_BATCH}, or every pending runner with --batch)")
+    args = parser.parse_args()
+    print_db_target()
+    if args.batch:
+        main_batch(args.max_batch)
+        return
+
     processed = 0
-    max_batch = 2
-    while processed < max_batch:
-        next_runner = get_next_runner_id()
-        if next_runner != -1:
-            print(f"Processing runner: {next_runner}")
+    max_batch = args.max_batch if args.max_batch is not None else DEFAULT_MAX_BATCH
+    # One session for the whole run instead of a checkout per helper call
+    with session_scope() as session:
+        reset = reset_in_flight(session)
+        if reset:
+            print(f"Requeued {reset} runner(s) left in flight by an interrupted run")
+        # Fetch the whole batch in one columns-only query rather than a
+        # SELECT ... LIMIT 1 per runner
+        pending = select_pending_runners(session, max_batch)
+        if not pending:
+            print("No runners to process. Exiting.")
+            return
+        mark_in_flight(session, [runner_id for runner_id, *_ in pending])
+        updates = []
+        examples = []
+        failed: Dict[int, str] = {}
+        for runner_id, first_name, last_name, college_team in pending:
+            print(f"Processing runner: {runner_id}")
             # Build user message for training data
-            session = get_db_session()
-            runner = session.query(Runner).filter(Runner.runner_id == next_runner).first()
-            user_message = f"{runner.first_name} {runner.last_name}, {runner.college_team}"
-            agent_output = use_agent(next_runner)
-            if agent_output:
-                try:
-                    update_runner_with_agent_output(next_runner, agent_output)
-                    print(f"AI Agent Response: {agent_output}")
-                    # Save to training data
-                    append_training_example(system_prompt, user_message, agent_output)
-                except Exception as e:
-                    print(f"Could not parse agent output: {e}")
-            else:
-                print("No agent response.")
+            user_message = f"{first_name} {last_name}, {college_team}"
+            try:
+                agent_output = use_agent(user_message)
+            except Exception as e:
+                print(f"Agent run failed for runner {runner_id}: {e}")
+                failed[runner_id] = str(e)
+                processed += 1
+                continue
+            updates.append(agent_output.runner_update(runner_id))
+            print(f"AI Agent Response: {agent_output}")
+            # Save to training data
+            examples.append(training_example(SYSTEM_PROMPT, user_message, agent_output))
             processed += 1
-            if processed < max_batch:
-                print("Waiting 40 seconds before next runner...")
-                time.sleep(50)
-        else:
-            print("No runners to process. Exiting.")
-            break
+        # Checkpoint the batch: successes are done, failures are retried up to
+        # MAX_AGENT_ATTEMPTS times across runs and then parked as failed
+        if not bulk_update_runners(session, updates):
+            failed.update((row["runner_id"], "could not store agent output") for row in updates)
+            # these runners are retried, so their examples are written by the run that stores them
+            updates = []
+            examples = []
+        finish_agent_runs(session, [row["runner_id"] for row in updates], failed)
+        append_training_examples(examples)
     print(f"Batch complete. Processed {processed} runner(s).")
 
 if __name__ == "__main__":
@@ -1,18 +1,19 @@
 """
 Clear all Runner records from the database.
 
-Executes a DELETE operation on the runners table via SQLAlchemy.
+Truncates the runners table (and the agent_runs checkpoints that reference
+it) via SQLAlchemy.
 """
 import logging
 import sys
 from pathlib import Path
 from sqlalchemy.orm import Session
-from sqlalchemy import delete
+from sqlalchemy import delete, func, select, text
 
 # Allow imports from project root
 sys.path.append(str(Path(__file__).parent.parent))
 from db.db_connection import get_engine
-from db.models import Runner
+from db.models import AgentRun, Runner
 
 
 def clear_runners() -> int:
@@ -21,10 +22,18 @@ def clear_runners() -> int:
     engine = get_engine()
     logging.info(f"Clearing runners using engine: {engine.url}")
     with Session(engine) as session:
-        # Delete all Runner rows
-        result = session.execute(delete(Runner))
+        # TRUNCATE reports no rowcount, so count first in the same transaction
+        deleted = session.execute(select(func.count()).select_from(Runner)).scalar_one()
+        if engine.dialect.name == "postgresql":
+            # Drops the table's data files wholesale instead of deleting row by row;
+            # CASCADE also empties agent_runs, which references runners
+            session.execute(text("TRUNCATE TABLE runners RESTART IDENTITY CASCADE"))
+        else:
+            # SQLite has no TRUNCATE; an unfiltered DELETE uses its truncate
+            # optimization. Foreign keys are not enforced, so clear children first.
+            session.execute(delete(AgentRun))
+            session.execute(delete(Runner))
         session.commit()
-        deleted = result.rowcount if result.rowcount is not None else 0
     return deleted
 
 
@@ -1,4 +1,4 @@
-import json
+import orjson
 from db.db_connection import get_db_session
 from db.models import Runner
 
@@ -30,26 +30,53 @@ Output:
 MODEL_NAME = "gpt-4.1-2"
 OUTPUT_PATH = "etl/data/batch_processing.jsonl"
 
+WRITE_BUFFER_SIZE = 1 << 20  # bytes
+WRITE_CHUNK_LINES = 1024  # task lines handed to writelines() at a time
+
+# Every task line is identical apart from its id and user message, so
+# serialize the envelope once with a sentinel in each slot
+TASK_TEMPLATE = orjson.dumps({
+    "custom_id": "__CID__",
+    "method": "POST",
+    "url": "/chat/completions",
+    "body": {
+        "model": MODEL_NAME,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": "__USER__"}
+        ]
+    }
+})
+# Split around the sentinels once, so each line is a join of pre-encoded
+# segments instead of two scans of the whole template
+TASK_PREFIX, _rest = TASK_TEMPLATE.split(b"__CID__")
+TASK_MIDDLE, TASK_SUFFIX = _rest.split(b"__USER__")
+TASK_SUFFIX += b"\n"
+
 def main():
     session = get_db_session()
-    runners = session.query(Runner).filter(Runner.swimmer == None).all()
-    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+    # Stream only the three columns the prompt needs instead of loading
+    # every Runner object into memory at once
+    runners = session.query(
+        Runner.first_name, Runner.last_name, Runner.college_team
+    ).filter(Runner.swimmer == None).yield_per(1000)
+    count = 0
+    lines = []
+    with open(OUTPUT_PATH, "wb", buffering=WRITE_BUFFER_SIZE) as f:
         for idx, runner in enumerate(runners):
             user_query = f"{runner.first_name} {runner.last_name}, {runner.college_team}"
-            entry = {
-                "custom_id": f"task-{idx}",
-                "method": "POST",
-                "url": "/chat/completions",
-                "body": {
-                    "model": MODEL_NAME,
-                    "messages": [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": user_query}
-                    ]
-                }
-            }
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
-    print(f"Wrote {len(runners)} tasks to {OUTPUT_PATH}")
+            # orjson.dumps of a str yields a quoted, escaped JSON string;
+            # strip the quotes so it drops into the template's string slot
+            lines.append(b"".join((
+                TASK_PREFIX, b"task-%d" % idx, TASK_MIDDLE, orjson.dumps(user_query)[1:-1], TASK_SUFFIX
+            )))
+            count += 1
+            if len(lines) >= WRITE_CHUNK_LINES:
+                f.writelines(lines)
+                lines.clear()
+        f.writelines(lines)
+    session.close()
+    print(f"Wrote {count} tasks to {OUTPUT_PATH}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
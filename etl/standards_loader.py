@@ -8,7 +8,7 @@ integrity through validation and normalization.
 Time Format Handling:
 - Swim times: "2:16 / 2:00" (SCY / LCM format)
 - Run times: "2:15" (minutes:seconds) or "34:00:00" (hours:minutes:seconds)
-- Converts all times to total seconds for database storage
+- Converts all times to hundredths of a second for database storage
 
 Usage:
     python etl/standards_loader.py
@@ -17,10 +17,10 @@ Usage:
 import csv
 import re
 import sys
-from decimal import Decimal
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 # Add parent directory to path for imports
@@ -53,10 +53,29 @@ AGE_GROUP_MAPPING = {
     "Men": "Open"
 }
 
+# Event name normalization: swim events are matched anywhere in the cell,
+# run events must match exactly
+SWIM_EVENTS = {
+    "200": "200_Free_LCM",
+    "400 / 500": "400_500_Free_LCM",
+    "800 / 1000": "800_1000_Free_LCM",
+    "1500 / 1650": "1500_1650_Free_LCM"
+}
+SWIM_EVENT_RE = re.compile(r"(200|400 / 500|800 / 1000|1500 / 1650) Free")
+
+RUN_EVENTS = {
+    "800": "800m_Run",
+    "1500": "1500m_Run",
+    "Mile": "Mile_Run",
+    "3000": "3000m_Run",
+    "5k": "5k_Run",
+    "10k": "10k_Run"
+}
+
 
-def parse_time_to_seconds(time_str: str) -> Optional[Decimal]:
+def parse_time_to_centiseconds(time_str: str) -> Optional[int]:
     """
-    Convert various time formats to total seconds.
+    Convert various time formats to total hundredths of a second.
     
     Handles:
     - Swimming: "2:16 / 2:00" (takes LCM time - second value)
@@ -67,7 +86,7 @@ def parse_time_to_seconds(time_str: str) -> Optional[Decimal]:
         time_str: Time string from CSV
         
     Returns:
-        Decimal seconds or None if parsing fails
+        Integer hundredths of a second or None if parsing fails
     """
     if not time_str or time_str.strip() == "":
         return None
@@ -91,7 +110,7 @@ def parse_time_to_seconds(time_str: str) -> Optional[Decimal]:
             minutes = int(parts[1])
             seconds = int(parts[2])
             total_seconds = hours * 3600 + minutes * 60 + seconds
-            return Decimal(str(total_seconds))
+            return total_seconds * 100
         except ValueError:
             print(f"Warning: Could not parse time format (HH:MM:SS): {time_str}")
             return None
@@ -102,8 +121,7 @@ def parse_time_to_seconds(time_str: str) -> Optional[Decimal]:
             parts = time_str.split(":")
             minutes = int(parts[0])
             seconds = float(parts[1])  # Allow decimal seconds
-            total_seconds = minutes * 60 + seconds
-            return Decimal(str(total_seconds)).quantize(Decimal('0.01'))
+            return minutes * 6000 + round(seconds * 100)
         except ValueError:
             print(f"Warning: Could not parse time format (MM:SS): {time_str}")
             return None
@@ -111,7 +129,7 @@ def parse_time_to_seconds(time_str: str) -> Optional[Decimal]:
     # Handle seconds only format
     else:
         try:
-            return Decimal(str(float(time_str))).quantize(Decimal('0.01'))
+            return round(float(time_str) * 100)
         except ValueError:
             print(f"Warning: Could not parse time format (seconds): {time_str}")
             return None
@@ -131,44 +149,28 @@ def normalize_event_name(event: str, discipline: str) -> str:
     event = event.strip()
     
     if discipline == "Swim":
-        # Handle swim events
-        if "200 Free" in event:
-            return "200_Free_LCM"
-        elif "400 / 500 Free" in event:
-            return "400_500_Free_LCM"
-        elif "800 / 1000 Free" in event:
-            return "800_1000_Free_LCM"
-        elif "1500 / 1650 Free" in event:
-            return "1500_1650_Free_LCM"
+        match = SWIM_EVENT_RE.search(event)
+        if match:
+            return SWIM_EVENTS[match.group(1)]
     
     elif discipline == "Run":
-        # Handle running events
-        if event == "800":
-            return "800m_Run"
-        elif event == "1500":
-            return "1500m_Run"
-        elif event == "Mile":
-            return "Mile_Run"
-        elif event == "3000":
-            return "3000m_Run"
-        elif event == "5k":
-            return "5k_Run"
-        elif event == "10k":
-            return "10k_Run"
+        if event in RUN_EVENTS:
+            return RUN_EVENTS[event]
     
     # Fallback: return original with underscores
     return event.replace(" ", "_").replace("/", "_")
 
 
-def load_standards_from_csv(csv_path: Path) -> List[TimeStandard]:
+def load_standards_from_csv(csv_path: Path) -> List[Dict]:
     """
-    Parse CSV file and create TimeStandard objects.
+    Parse CSV file into TimeStandard row mappings.
     
     Args:
         csv_path: Path to tri_standards.csv file
         
     Returns:
-        List of TimeStandard objects ready for database insertion    """
+        List of column dicts ready for a bulk insert into time_standards
+    """
     standards = []
     try:
         with open(csv_path, 'r', encoding='utf-8-sig') as f:  # utf-8-sig handles BOM
@@ -198,36 +200,27 @@ def load_standards_from_csv(csv_path: Path) -> List[TimeStandard]:
                 # Normalize event name
                 normalized_event = normalize_event_name(event, discipline)
 
-                # Process each performance tier
-                tier_columns = [
-                    "World Leading",
-                    "Internationally Ranked", 
-                    "Nationally Competitive",
-                    "Development Potential"
-                ]
-
-                for tier in tier_columns:
+                # Process each performance tier; COLOR_MAPPING lists the tier
+                # columns in CSV order alongside their color codes
+                for tier, color_code in COLOR_MAPPING.items():
                     time_value = row.get(tier, "").strip()
                     if not time_value:
                         continue
 
-                    cutoff_seconds = parse_time_to_seconds(time_value)
-                    if cutoff_seconds is None:
+                    cutoff_cs = parse_time_to_centiseconds(time_value)
+                    if cutoff_cs is None:
                         print(f"Warning: Could not parse time '{time_value}' for {category} {normalized_event} {tier} on row {row_num}")
                         continue
 
-                    # Create TimeStandard object
-                    standard = TimeStandard(
-                        gender=gender,
-                        age_group=age_group,
-                        event=normalized_event,
-                        category=tier,
-                        cutoff_seconds=cutoff_seconds,
-                        color_code=COLOR_MAPPING.get(tier),
-                        display_order=len(standards)
-                    )
-
-                    standards.append(standard)
+                    standards.append({
+                        'gender': gender,
+                        'age_group': age_group,
+                        'event': normalized_event,
+                        'category': tier,
+                        'cutoff_cs': cutoff_cs,
+                        'color_code': color_code,
+                        'display_order': len(standards)
+                    })
 
     except FileNotFoundError:
         print(f"Error: CSV file not found at {csv_path}")
@@ -256,12 +249,12 @@ def clear_existing_standards(session: Session) -> None:
         raise
 
 
-def load_standards_to_database(standards: List[TimeStandard]) -> None:
+def load_standards_to_database(standards: List[Dict]) -> None:
     """
     Load time standards into the database with proper error handling.
     
     Args:
-        standards: List of TimeStandard objects to insert
+        standards: List of TimeStandard column dicts to insert
     """
     engine = get_engine()
     
@@ -270,9 +263,8 @@ def load_standards_to_database(standards: List[TimeStandard]) -> None:
             # Clear existing data
             clear_existing_standards(session)
             
-            # Insert new standards
-            for standard in standards:
-                session.add(standard)
+            # Insert new standards in a single executemany
+            session.execute(insert(TimeStandard), standards)
             
             session.commit()
             print(f"Successfully loaded {len(standards)} time standards")
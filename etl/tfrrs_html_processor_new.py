@@ -5,17 +5,17 @@ import argparse
 import logging
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from decimal import Decimal
 from pathlib import Path
 from typing import List, Dict, Optional
 
-from bs4 import BeautifulSoup
+from lxml import etree, html
 from sqlalchemy.orm import Session
 
 # Local imports
 sys.path.append(str(Path(__file__).parent.parent))
-from db.db_connection import get_engine
+from db.db_connection import bulk_upsert, get_engine
 from db.models import Runner
 
 # Ensure console can handle Unicode
@@ -44,55 +44,99 @@ TARGET_EVENTS = {
     '3000steeplechase': ['steeplechase', 'steeple']
 }
 
+# All event spellings, lowercased once for substring checks
+TARGET_EVENT_VARIATIONS = tuple(
+    variation.lower() for variations in TARGET_EVENTS.values() for variation in variations
+)
+
+# Stored name for each TARGET_EVENTS key
+NORMALIZED_EVENT_NAMES = {
+    '800': '800m',
+    'mile': 'mile',
+    '3000': '3000m',
+    '5000': '5000m',
+    '1500': '1500m',
+    '10000': '10000m',
+    '3000steeplechase': '3000m_steeplechase'
+}
+
+# (spelling, stored name) pairs in TARGET_EVENTS order; the first hit wins
+EVENT_VARIATION_NAMES = tuple(
+    (variation.lower(), NORMALIZED_EVENT_NAMES[key])
+    for key, variations in TARGET_EVENTS.items() for variation in variations
+)
+
 # Maximum athletes to store per event
 MAX_ATHLETES_PER_EVENT = 500
 
 
-def parse_time_to_seconds(time_str: str) -> Optional[Decimal]:
-    """Convert a performance mark into total seconds."""
+# Saved TFRRS pages are UTF-8
+HTML_PARSER = html.HTMLParser(encoding='utf-8')
+
+# Compiled once; these run for every event title and athlete row
+TIME_DECIMAL_RE = re.compile(r'(?:(\d+):)?(\d+\.\d+)')
+TIME_WHOLE_RE = re.compile(r'(?:(\d+):)?(\d+)')
+EVENT_DISTANCE_RE = re.compile(r'(\d{1,2},?\d{3}(?:\.\d+)?\s*(?:Meters|Meter|m|Miles?|Mile))', re.IGNORECASE)
+EVENT_SHORT_DISTANCE_RE = re.compile(r'(\d+(?:\.\d+)?\s*(?:Meters|Meter|m|Miles?|Mile))', re.IGNORECASE)
+METERS_RE = re.compile(r'meters?|m')
+PLACE_RE = re.compile(r'\d+')
+
+
+def _has_class(name: str) -> str:
+    """XPath predicate matching one token of @class, like BeautifulSoup's class_."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Compiled once at import and evaluated inside libxml2 for every list and row
+PERFORMANCE_LISTS = etree.XPath(f"//div[{_has_class('performance-list')}]")
+PERFORMANCE_ROWS = etree.XPath(f".//div[{_has_class('performance-list-row')}]")
+TABLE_TITLE = etree.XPath(f"(.//div[{_has_class('custom-table-title')}])[1]")
+FIRST_H3 = etree.XPath("(.//h3)[1]")
+FIRST_LINK = etree.XPath("(.//a)[1]")
+COL_PLACE = etree.XPath(f"(.//div[{_has_class('col-place')}])[1]")
+COL_ATHLETE = etree.XPath(f"(.//div[{_has_class('col-athlete')}])[1]")
+COL_TEAM = etree.XPath(f"(.//div[{_has_class('col-team')}])[1]")
+COL_MEET = etree.XPath(f"(.//div[{_has_class('col-meet')}])[1]")
+COL_YEAR = etree.XPath(f"(.//div[{_has_class('col-narrow')} and @data-label='Year'])[1]")
+COL_TIME = etree.XPath(f"(.//div[{_has_class('col-narrow')} and @data-label='Time'])[1]")
+COL_MEET_DATE = etree.XPath(f"(.//div[{_has_class('col-narrow')} and @data-label='Meet Date'])[1]")
+
+
+def _first(xpath: etree.XPath, element) -> Optional[html.HtmlElement]:
+    """Return the first match of a compiled XPath, or None."""
+    matches = xpath(element)
+    return matches[0] if matches else None
+
+
+def _link_or_text(div: html.HtmlElement) -> str:
+    """Text of the div's first link, or of the div itself when it has none."""
+    link = _first(FIRST_LINK, div)
+    return (link if link is not None else div).text_content().strip()
+
+
+def parse_time_to_centiseconds(time_str: str) -> Optional[int]:
+    """Convert a performance mark into total hundredths of a second."""
     if not time_str or not time_str.strip():
         return None
         
-    # Clean the string - remove wind readings and other annotations
-    time_match = re.search(r'(\d+:)?\d+\.\d+', time_str.strip())
-    if not time_match:
-        time_match = re.search(r'(\d+:)?\d+', time_str.strip())
-    
+    # Take the mark itself, ignoring wind readings and other annotations;
+    # prefer a mark with hundredths over a bare whole number
+    time_match = TIME_DECIMAL_RE.search(time_str) or TIME_WHOLE_RE.search(time_str)
     if not time_match:
         return None
-        
-    cleaned = time_match.group(0)
     
-    try:
-        if ':' in cleaned:
-            # Format like "1:45.23" 
-            parts = cleaned.split(':')
-            if len(parts) == 2:
-                mins = int(parts[0])
-                secs = float(parts[1])
-                total = mins * 60 + secs
-                return Decimal(str(total)).quantize(Decimal('0.01'))
-        else:
-            # Format like "45.23" (seconds only)
-            total = float(cleaned)
-            return Decimal(str(total)).quantize(Decimal('0.01'))
-    except (ValueError, Exception) as e:
-        logger.debug(f"Could not parse time '{time_str}': {e}")
-        return None
-    
-    return None
+    # Format like "1:45.23" or "45.23"; the regex guarantees digits
+    mins, secs = time_match.groups()
+    centiseconds = round(float(secs) * 100)
+    if mins:
+        centiseconds += int(mins) * 6000
+    return centiseconds
 
 
 def is_target_event(event_name: str) -> bool:
     """Check if an event is one of our target outdoor distance events."""
     event_lower = event_name.lower()
-    
-    for target_key, variations in TARGET_EVENTS.items():
-        for variation in variations:
-            if variation.lower() in event_lower:
-                return True
-    
-    return False
+    return any(variation in event_lower for variation in TARGET_EVENT_VARIATIONS)
 
 
 def normalize_event_name(event_name: str) -> str:
@@ -100,46 +144,32 @@ def normalize_event_name(event_name: str) -> str:
     event_lower = event_name.lower()
     
     # Check each target event category (indoor and outdoor)
-    if any(var in event_lower for var in TARGET_EVENTS['800']):
-        return '800m'
-    elif any(var in event_lower for var in TARGET_EVENTS['mile']):
-        return 'mile'
-    elif any(var in event_lower for var in TARGET_EVENTS['3000']):
-        return '3000m'
-    elif any(var in event_lower for var in TARGET_EVENTS['5000']):
-        return '5000m'
-    elif any(var in event_lower for var in TARGET_EVENTS['1500']):
-        return '1500m'
-    elif any(var in event_lower for var in TARGET_EVENTS['10000']):
-        return '10000m'
-    elif any(var in event_lower for var in TARGET_EVENTS['3000steeplechase']):
-        return '3000m_steeplechase'
-    return event_name
+    return next((name for variation, name in EVENT_VARIATION_NAMES if variation in event_lower), event_name)
 
 
 def extract_event_info_from_context(performance_list_div) -> Dict[str, str]:
     """Extract event name and gender from the context around a performance list."""
     # Look for the custom-table-title div that should be before this performance list
-    current = performance_list_div.parent
-    while current:
-        title_div = current.find('div', class_='custom-table-title')
-        if title_div:
-            h3_tag = title_div.find('h3')
-            if h3_tag:
-                title_text = h3_tag.get_text().strip()
+    current = performance_list_div.getparent()
+    while current is not None:
+        title_div = _first(TABLE_TITLE, current)
+        if title_div is not None:
+            h3_tag = _first(FIRST_H3, title_div)
+            if h3_tag is not None:
+                title_text = h3_tag.text_content().strip()
                 
                 # Extract event name - handle formats like "10,000 Meters", "1500 Meters", etc.
-                event_match = re.search(r'(\d{1,2},?\d{3}(?:\.\d+)?\s*(?:Meters|Meter|m|Miles?|Mile))', title_text, re.IGNORECASE)
+                event_match = EVENT_DISTANCE_RE.search(title_text)
                 if not event_match:
                     # Try for shorter distances like "800 Meters"
-                    event_match = re.search(r'(\d+(?:\.\d+)?\s*(?:Meters|Meter|m|Miles?|Mile))', title_text, re.IGNORECASE)
+                    event_match = EVENT_SHORT_DISTANCE_RE.search(title_text)
                 
                 if event_match:
                     event_name = event_match.group(1).replace(' ', '').lower()
                     # Normalize event names - remove commas for consistency
                     event_name = event_name.replace(',', '')
                     if 'meter' in event_name or 'm' in event_name:
-                        event_name = re.sub(r'meters?|m', 'm', event_name)
+                        event_name = METERS_RE.sub('m', event_name)
                 else:
                     # Fallback - use the first part before parentheses
                     event_name = title_text.split('(')[0].strip()
@@ -153,7 +183,7 @@ def extract_event_info_from_context(performance_list_div) -> Dict[str, str]:
                 
                 return {'event': event_name, 'gender': gender}
         
-        current = current.parent
+        current = current.getparent()
     
     return {'event': 'Unknown', 'gender': 'M'}
 
@@ -162,24 +192,20 @@ def extract_athlete_from_performance_row(row_div, event_name: str, gender: str)
     """Extract athlete data from a performance-list-row div."""
     try:
         # Extract place/rank
-        place_div = row_div.find('div', class_='col-place')
+        place_div = _first(COL_PLACE, row_div)
         rank = 1
-        if place_div:
-            place_text = place_div.get_text().strip()
-            rank_match = re.search(r'\d+', place_text)
+        if place_div is not None:
+            place_text = place_div.text_content().strip()
+            rank_match = PLACE_RE.search(place_text)
             if rank_match:
                 rank = int(rank_match.group())
 
         # Extract athlete name
-        athlete_div = row_div.find('div', class_='col-athlete')
-        if not athlete_div:
+        athlete_div = _first(COL_ATHLETE, row_div)
+        if athlete_div is None:
             return None
             
-        athlete_link = athlete_div.find('a')
-        if athlete_link:
-            name_text = athlete_link.get_text().strip()
-        else:
-            name_text = athlete_div.get_text().strip()
+        name_text = _link_or_text(athlete_div)
         
         if not name_text or len(name_text) < 3:
             return None
@@ -200,51 +226,39 @@ def extract_athlete_from_performance_row(row_div, event_name: str, gender: str)
                 last_name = ""
         
         # Extract year/class
-        year_div = row_div.find('div', class_='col-narrow', attrs={'data-label': 'Year'})
+        year_div = _first(COL_YEAR, row_div)
         year_text = ""
-        if year_div:
-            year_text = year_div.get_text().strip()
+        if year_div is not None:
+            year_text = year_div.text_content().strip()
         
         # Extract team/school
-        team_div = row_div.find('div', class_='col-team')
+        team_div = _first(COL_TEAM, row_div)
         school = "Unknown School"
-        if team_div:
-            team_link = team_div.find('a')
-            if team_link:
-                school = team_link.get_text().strip()
-            else:
-                school = team_div.get_text().strip()
+        if team_div is not None:
+            school = _link_or_text(team_div)
         
         # Extract performance time
-        time_div = row_div.find('div', class_='col-narrow', attrs={'data-label': 'Time'})
-        if not time_div:
+        time_div = _first(COL_TIME, row_div)
+        if time_div is None:
             return None
             
-        time_link = time_div.find('a')
-        if time_link:
-            time_text = time_link.get_text().strip()
-        else:
-            time_text = time_div.get_text().strip()
+        time_text = _link_or_text(time_div)
         
-        performance_time = parse_time_to_seconds(time_text)
-        if performance_time is None or performance_time <= 0:
+        performance_time_cs = parse_time_to_centiseconds(time_text)
+        if performance_time_cs is None or performance_time_cs <= 0:
             return None
         
         # Extract meet info (optional)
-        meet_div = row_div.find('div', class_='col-meet')
+        meet_div = _first(COL_MEET, row_div)
         meet_name = ""
-        if meet_div:
-            meet_link = meet_div.find('a')
-            if meet_link:
-                meet_name = meet_link.get_text().strip()
-            else:
-                meet_name = meet_div.get_text().strip()
+        if meet_div is not None:
+            meet_name = _link_or_text(meet_div)
         
         # Extract meet date (optional)
-        date_div = row_div.find('div', class_='col-narrow', attrs={'data-label': 'Meet Date'})
+        date_div = _first(COL_MEET_DATE, row_div)
         meet_date = ""
-        if date_div:
-            meet_date = date_div.get_text().strip()
+        if date_div is not None:
+            meet_date = date_div.text_content().strip()
         
         athlete_data = {
             'rank': rank,
@@ -252,7 +266,7 @@ def extract_athlete_from_performance_row(row_div, event_name: str, gender: str)
             'last_name': last_name.lower(),
             'college_team': school,
             'event': event_name,
-            'performance_time': performance_time,
+            'performance_time_cs': performance_time_cs,
             'year_scraped': datetime.now().year,
             'gender': gender,
             'raw_performance': time_text,
@@ -281,15 +295,16 @@ def process_html_file(file_path: str) -> List[Dict[str, str]]:
     """
     logger.info(f"Processing HTML file: {file_path}")
     
-    with open(file_path, 'r', encoding='utf-8') as file:
-        content = file.read()
-    
-    soup = BeautifulSoup(content, 'html.parser')
+    # Feed the raw bytes to libxml2 in chunks, rather than decoding the whole
+    # page into a Python string first and handing that copy over. Python opens
+    # the file so non-ASCII file names work on every platform.
+    with open(file_path, 'rb') as file:
+        tree = html.parse(file, parser=HTML_PARSER).getroot()
     athletes = []
     event_counts = {}
     
     # Find all performance-list sections
-    performance_lists = soup.find_all('div', class_='performance-list')
+    performance_lists = PERFORMANCE_LISTS(tree)
     logger.info(f"Found {len(performance_lists)} performance lists")
     
     for list_div in performance_lists:
@@ -314,7 +329,7 @@ def process_html_file(file_path: str) -> List[Dict[str, str]]:
             event_counts[event_key] = 0
         
         # Find all performance rows in this list
-        rows = list_div.find_all('div', class_='performance-list-row')
+        rows = PERFORMANCE_ROWS(list_div)
         logger.info(f"Found {len(rows)} athletes in this event")
         
         for row in rows:
@@ -350,85 +365,63 @@ def process_html_file(file_path: str) -> List[Dict[str, str]]:
     return list(unique_athletes.values())
 
 
+def build_raw_data(data: Dict) -> Dict[str, str]:
+    """Build the raw_data payload kept alongside each runner for debugging."""
+    return {
+        'raw_performance': data['raw_performance'],
+        'class_year': data.get('class_year', ''),
+        'meet_name': data.get('meet_name', ''),
+        'meet_date': data.get('meet_date', ''),
+        'scrape_source': 'TFRRS_HTML'
+    }
+
+
 def store_athletes(athletes: List[Dict]) -> None:
     """Store athletes in the database, upserting by first_name + last_name."""
     if not athletes:
         logger.info("No athletes to store")
         return
 
+    # One row per identity; later rows win, as with the old row-by-row upsert
+    rows = {}
+    for data in athletes:
+        rows[(data['first_name'], data['last_name'])] = {
+            'first_name': data['first_name'],
+            'last_name': data['last_name'],
+            'college_team': data['college_team'],
+            'event': data['event'],
+            'performance_time_cs': data['performance_time_cs'],
+            'year': data['year_scraped'],
+            'gender': data['gender'],
+            'class_year': data.get('class_year', None),
+            'scrape_timestamp': data['scrape_timestamp'],
+            'raw_data': build_raw_data(data),
+        }
+
     engine = get_engine()
     try:
         with Session(engine) as session:
-            stored_count = 0
-            for data in athletes:
-                # Try to find an existing runner by first_name + last_name
-                runner = session.query(Runner).filter_by(
-                    first_name=data['first_name'],
-                    last_name=data['last_name']
-                ).first()
-                if runner:
-                    # Update fields
-                    runner.college_team = data['college_team']
-                    runner.event = data['event']
-                    runner.performance_time = data['performance_time']
-                    runner.year = data['year_scraped']
-                    runner.gender = data['gender']
-                    runner.class_year = data.get('class_year', None)
-                    runner.scrape_timestamp = data['scrape_timestamp']
-                    runner.raw_data = {
-                        'raw_performance': data['raw_performance'],
-                        'class_year': data.get('class_year', ''),
-                        'meet_name': data.get('meet_name', ''),
-                        'meet_date': data.get('meet_date', ''),
-                        'scrape_source': 'TFRRS_HTML'
-                    }
-                else:
-                    # Insert new runner
-                    runner = Runner(
-                        first_name=data['first_name'],
-                        last_name=data['last_name'],
-                        college_team=data['college_team'],
-                        event=data['event'],
-                        performance_time=data['performance_time'],
-                        year=data['year_scraped'],
-                        gender=data['gender'],
-                        birth_year=None,
-                        class_year=data.get('class_year', None),
-                        scrape_timestamp=data['scrape_timestamp'],
-                        raw_data={
-                            'raw_performance': data['raw_performance'],
-                            'class_year': data.get('class_year', ''),
-                            'meet_name': data.get('meet_name', ''),
-                            'meet_date': data.get('meet_date', ''),
-                            'scrape_source': 'TFRRS_HTML'
-                        }
-                    )
-                    session.add(runner)
-                stored_count += 1
-
+            bulk_upsert(session, Runner, list(rows.values()), ['first_name', 'last_name'])
             session.commit()
-            logger.info(f"Successfully stored {stored_count} athletes in database")
+            logger.info(f"Successfully stored {len(rows)} athletes in database")
 
     except Exception as e:
         logger.error(f"Database error: {e}")
         raise
 
 
-def main():
-    """Main processing function."""
-    parser = argparse.ArgumentParser(description='TFRRS HTML Content Processor')
-    parser.add_argument('--file', help='HTML file to process (relative to etl/data/)', required=True)
-    args = parser.parse_args()
-
-    # Get filename and ensure .html extension
-    file_path = args.file
+def resolve_html_path(file_path: str) -> str:
+    """Add the .html extension and resolve relative names against etl/data/."""
     if not file_path.lower().endswith('.html'):
         file_path = f"{file_path}.html"
     # Always look for files in etl/data/ unless an absolute path is given
     if not Path(file_path).is_absolute():
         file_path = str(Path(__file__).parent / 'data' / file_path)
+    return file_path
+
 
-    athletes = process_html_file(file_path)
+def store_file_athletes(file_path: str, athletes: List[Dict]) -> None:
+    """Store one file's athletes and report the outcome."""
     if athletes:
         store_athletes(athletes)
         print(f"Stored {len(athletes)} athletes from {file_path}.")
@@ -436,5 +429,25 @@ def main():
         print(f"No athletes found in {file_path}.")
 
 
+def main():
+    """Main processing function."""
+    parser = argparse.ArgumentParser(description='TFRRS HTML Content Processor')
+    parser.add_argument('--file', nargs='+', help='HTML file(s) to process (relative to etl/data/)', required=True)
+    parser.add_argument('--workers', type=int, default=None, help='Parser processes when several files are given (default: CPU count)')
+    args = parser.parse_args()
+
+    file_paths = [resolve_html_path(file_path) for file_path in args.file]
+
+    # Parsing is CPU-bound, so several files are parsed in separate processes;
+    # results are stored from this process in the order the files were given
+    if len(file_paths) > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            results = executor.map(process_html_file, file_paths)
+            for file_path, athletes in zip(file_paths, results):
+                store_file_athletes(file_path, athletes)
+    else:
+        store_file_athletes(file_paths[0], process_html_file(file_paths[0]))
+
+
 if __name__ == "__main__":
     main()
@@ -1,76 +1,86 @@
-import json
+import orjson
+from typing import Optional
+from db.agent_output import AgentOutput
 from db.db_connection import get_db_session
 from db.models import Runner
 from rapidfuzz import process, fuzz
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session, load_only
 
 BATCH_FILE = "etl/data/batch1_complete.jsonl"
+COLLEGE_MATCH_THRESHOLD = 60
 
-def update_runner_from_agent_output(agent_output: dict):
+def match_runner_update(session: Session, agent_output: AgentOutput) -> Optional[dict]:
     """
-    Update the runner's record in the database with AI agent output.
-    Uses fuzzy matching for college name.
+    Resolve AI agent output to a runner and return its update row.
+    Uses fuzzy matching for college name. Returns None when no runner matches.
     """
+    name = agent_output.name
+    college = agent_output.college
+    # Parse name
+    parts = name.strip().split()
+    if len(parts) < 2:
+        print(f"Invalid name format: {name}")
+        return None
+    first_name = parts[0].lower()
+    last_name = " ".join(parts[1:]).lower()
+    # Get all possible colleges for this runner name; only the key and team
+    # are needed, so skip hydrating raw_data and the other columns
+    candidates = session.query(Runner).options(
+        load_only(Runner.runner_id, Runner.first_name, Runner.last_name, Runner.college_team)
+    ).filter(
+        func.lower(Runner.first_name) == first_name,
+        func.lower(Runner.last_name) == last_name
+    ).all()
+    if not candidates:
+        print(f"No runner found for {name}, {college}")
+        return None
+    # Fuzzy match on college name; extractOne scores every candidate in one C call.
+    # score_cutoff lets the scorer bail out early on candidates that cannot reach it.
+    college_names = [c.college_team for c in candidates]
+    best = process.extractOne(
+        college, college_names, scorer=fuzz.token_set_ratio, score_cutoff=COLLEGE_MATCH_THRESHOLD
+    )
+    if best is None:
+        print(f"No good college match for {name}, {college} (no candidate scored {COLLEGE_MATCH_THRESHOLD}+)")
+        return None
+    _, best_score, best_index = best
+    runner = candidates[best_index]
+    print(f"Matched runner: {runner.first_name} {runner.last_name}, {runner.college_team} (fuzzy score {best_score})")
+    return agent_output.runner_update(runner.runner_id)
+
+def main():
     session = get_db_session()
     try:
-        name = agent_output.get("name", "")
-        college = agent_output.get("college", "")
-        # Parse name
-        parts = name.strip().split()
-        if len(parts) < 2:
-            print(f"Invalid name format: {name}")
-            return
-        first_name = parts[0].lower()
-        last_name = " ".join(parts[1:]).lower()
-        # Get all possible colleges for this runner name
-        candidates = session.query(Runner).filter(
-            Runner.first_name == first_name,
-            Runner.last_name == last_name
-        ).all()
-        if not candidates:
-            print(f"No runner found for {name}, {college}")
-            return
-        # Fuzzy match on college name
-        college_names = [c.college_team for c in candidates]
-        best_match = None
-        best_score = 0
-        for c in candidates:
-            score = fuzz.token_set_ratio(college, c.college_team)
-            if score > best_score:
-                best_score = score
-                best_match = c
-        if best_score < 60:
-            print(f"No good college match for {name}, {college}. Best: {best_match.college_team if best_match else None} (score {best_score})")
-            return
-        runner = best_match
-        runner.high_school = agent_output.get("high_school")
-        runner.hometown = agent_output.get("hometown")
-        runner.swimmer = agent_output.get("swimmer")
-        runner.score = agent_output.get("score")
-        runner.match_confidence = agent_output.get("match_confidence")       
+        updates = []
+        # Read raw bytes; orjson decodes UTF-8 itself
+        with open(BATCH_FILE, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    result = orjson.loads(line)
+                    # Updated parsing for batch output structure
+                    agent_json = result["response"]["body"]["choices"][0]["message"]["content"]
+                    if isinstance(agent_json, str):
+                        agent_output = AgentOutput.model_validate_json(agent_json)
+                    else:
+                        agent_output = AgentOutput.model_validate(agent_json)
+                    row = match_runner_update(session, agent_output)
+                    if row:
+                        updates.append(row)
+                except Exception as e:
+                    print(f"Error processing line: {e}")
+        # One executemany UPDATE keyed on runner_id and a single commit for the whole file
+        if updates:
+            session.execute(update(Runner), updates)
         session.commit()
-        print(f"Updated runner: {runner.first_name} {runner.last_name}, {runner.college_team} (fuzzy score {best_score})")
+        print(f"Updated {len(updates)} runners from {BATCH_FILE}")
     except Exception as e:
         session.rollback()
-        print(f"Error updating runner: {e}")
+        print(f"Error updating runners: {e}")
     finally:
         session.close()
 
-def main():
-    with open(BATCH_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                result = json.loads(line)
-                # Updated parsing for batch output structure
-                agent_json = result["response"]["body"]["choices"][0]["message"]["content"]
-                if isinstance(agent_json, str):
-                    agent_output = json.loads(agent_json)
-                else:
-                    agent_output = agent_json
-                update_runner_from_agent_output(agent_output)
-            except Exception as e:
-                print(f"Error processing line: {e}")
-
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,198 +1,165 @@
+import asyncio
+import functools
+import hashlib
 import os
+import sqlite3
 import sys
-import json
 import time
 from pathlib import Path
-from db.db_connection import get_db_session
-from db.models import Runner
+from db.db_connection import session_scope
+from db.agent_runs import finish_agent_runs, mark_in_flight, reset_in_flight, select_pending_runners
+from db.agent_output import AgentOutput, AgentRunError
+from etl.agent_common import (
+    agent_retry, append_training_examples, azure_credential, bulk_update_runners, print_db_target, training_example,
+)
 
-from typing import List, Any
+from typing import TYPE_CHECKING, Dict, List, Any, Optional
 
-from opentelemetry import trace
 #from azure.monitor.opentelemetry import configure_azure_monitor
-from azure.ai.projects import AIProjectClient
-from azure.ai.agents import AgentsClient
-from azure.identity import DefaultAzureCredential
 
+# The Azure SDKs are imported inside the functions that use them, so
+# importing this module does not load them
+if TYPE_CHECKING:
+    from azure.ai.agents.aio import AgentsClient
 
-sys.path.append(str(Path(__file__).parent.parent))
-print(f"DATABASE_URL: {os.getenv('DATABASE_URL')}")
-
-from sqlalchemy import inspect
-session = get_db_session()
-engine = session.get_bind()
-if engine.dialect.name == "sqlite":
-    print(f"Connected SQLite DB file: {engine.url.database}")
-session.close()
 
-def use_agent(runner_id: int) -> str:
-    project_endpoint = os.environ["PROJECT_ENDPOINT"]  # Ensure the PROJECT_ENDPOINT environment variable is set
-    
+sys.path.append(str(Path(__file__).parent.parent))
 
-    agents_client = AgentsClient(
-        endpoint=project_endpoint,
-        credential=DefaultAzureCredential(),
+AGENT_ID = "asst_yGc1n6WeUULxruHX3TCbG61U"
+MAX_CONCURRENT_AGENT_RUNS = 8  # stay under the project's agent-run rate limit
+AGENT_CACHE_PATH = os.getenv("AGENT_CACHE_PATH", "agent_cache.sqlite")
+AGENT_CACHE_TTL = 30 * 86400  # seconds; re-check a runner after a month
+
+@agent_retry
+async def use_agent(agents_client: "AgentsClient", runner_info: str) -> AgentOutput:
+    from azure.ai.agents.models import AgentThreadCreationOptions, ThreadMessageOptions
+    # Create the thread, post the runner message and run the agent in one
+    # request instead of separate thread/message/run calls
+    run = await agents_client.create_thread_and_process_run(
+        agent_id=AGENT_ID,
+        thread=AgentThreadCreationOptions(
+            messages=[ThreadMessageOptions(role="user", content=runner_info)],
+        ),
+        parallel_tool_calls=True,
     )
 
-    session = get_db_session()
-    runner = session.query(Runner).filter(Runner.runner_id == runner_id).first()
-    runner_info = f"{runner.first_name} {runner.last_name}, {runner.college_team}"
-
-    with agents_client:
-        agent = agents_client.get_agent("asst_yGc1n6WeUULxruHX3TCbG61U") 
+    # Check if the run was successful
+    if run.status == "failed":
+        raise AgentRunError(f"Run failed: {run.last_error}")
     
-        # Create a new thread for the agent interaction
-        thread = agents_client.threads.create()
-
-        # Create a user message with the runner information
-        message = agents_client.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=runner_info,
-        )
-        
-        # Run the agent with the created thread
-        run = agents_client.runs.create_and_process(thread_id=thread.id, agent_id=agent.id)
-
-        # Check if the run was successful
-        if run.status == "failed":
-            return f"Run failed: {run.last_error}"
-        
-        # Fetch and return the assistant's response
-        messages = agents_client.messages.list(thread_id=thread.id)
-
-        #response_message = project_client.messages.get_last_message_by_role(thread_id=thread.id, role="assistant")
-        for message in messages:
-            if message.role == "assistant":
-                #print(f"Assistant response: {message.content[0]['text']['value']}")
-                response = json.loads(message.content[0]['text']['value'])
-                #project_client.agents.threads.delete(thread_id=thread.id)
-                return response
-        
-        #project_client.agents.threads.delete(thread_id=thread.id)
-        return "No assistant response found."
-
-def get_next_runner_id() -> int:
-    """
-    Fetch the next runner from the database that needs AI processing.
-    
-    This function should connect to your database and retrieve a runner
-    that has not yet been processed by the AI agent.
+    # Fetch and return the assistant's response
+    messages = agents_client.messages.list(thread_id=run.thread_id)
+
+    #response_message = project_client.messages.get_last_message_by_role(thread_id=thread.id, role="assistant")
+    async for message in messages:
+        if message.role == "assistant":
+            #print(f"Assistant response: {message.content[0]['text']['value']}")
+            # Parse and validate in one pass; a malformed answer raises ValidationError
+            response = AgentOutput.model_validate_json(message.content[0]['text']['value'])
+            return response
     
-    Returns:
-        str: A string containing the runner's information.
-    """
-    session = get_db_session()
-    runner = session.query(Runner).filter(Runner.swimmer == None).first()
-    if runner:
-        return runner.runner_id
-    return -1
-
-def build_user_query(runner_id: int) -> str:
-    """
-    Build a user query string for the AI agent based on the runner's information.
-
-    Args:
-        runner_id (int): The ID of the runner.
-
-    Returns:
-        str: A formatted string containing the runner's information.
+    raise AgentRunError("No assistant response found.")
+
+@functools.lru_cache(maxsize=1)
+def _agent_cache() -> sqlite3.Connection:
+    # one autocommit connection for the process; only the main thread writes
+    conn = sqlite3.connect(AGENT_CACHE_PATH, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS agent_cache ("
+                 "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)")
+    return conn
+
+def _agent_cache_key(runner_info: str) -> str:
+    # "First Last, College" -> case- and whitespace-insensitive digest
+    return hashlib.sha256(" ".join(runner_info.lower().split()).encode()).hexdigest()
+
+def _agent_cache_get(runner_info: str) -> Optional[AgentOutput]:
+    row = _agent_cache().execute("SELECT response, created_at FROM agent_cache WHERE key = ?",
+                                 (_agent_cache_key(runner_info),)).fetchone()
+    if row is None or time.time() - row[1] > AGENT_CACHE_TTL:
+        return None
+    return AgentOutput.model_validate_json(row[0])
+
+def _agent_cache_put(runner_info: str, response: AgentOutput) -> None:
+    _agent_cache().execute("INSERT OR REPLACE INTO agent_cache (key, response, created_at) VALUES (?, ?, ?)",
+                           (_agent_cache_key(runner_info), response.model_dump_json(), time.time()))
+
+async def use_agent_many(runner_infos: List[str]) -> List[Any]:
     """
-    session = get_db_session()
-    runner = session.query(Runner).filter(Runner.id == runner_id).first()
-    if runner:
-        return f"{runner.first_name} {runner.last_name}, {runner.college_team}"
-    return "Runner not found."
+    Run the agent for every runner concurrently, bounded by a semaphore.
 
-def update_runner_with_agent_output(runner_id: int, agent_output: dict) -> None:
+    Runners already resolved within AGENT_CACHE_TTL are answered from the
+    agent cache without an agent run; new answers are written back to it.
+    One credential and client are shared by all runs, so the AAD token and
+    the HTTPS connection pool are reused. Failed runs come back as exceptions
+    in the result list instead of cancelling the rest.
     """
-    Update the runner's record in the database with AI agent output.
-
-    Args:
-        agent_output (dict): Dictionary with keys: name, college, class, high_school, hometown, swimmer, score, match_confidence.
-    """
-    session = get_db_session()
-    try:
-        # Find the runner by id
-        runner = session.query(Runner).filter(
-            Runner.runner_id == runner_id,
-        ).first()
-        if not runner:
-            print(f"No runner found for ID {runner_id}")
-            return
-        runner.high_school = agent_output.get("high_school")
-        runner.hometown = agent_output.get("hometown")
-        runner.swimmer = agent_output.get("swimmer")
-        runner.score = agent_output.get("score")
-        runner.match_confidence = agent_output.get("match_confidence")
-        session.commit()
-        print(f"Runner {runner.runner_id} updated with agent output.")
-    except Exception as e:
-        session.rollback()
-        print(f"Error updating runner: {e}")
-    finally:
-        session.close()
-    
-
-def append_training_example(system_prompt: str, user_message: str, assistant_response: dict, jsonl_path: str = "etl/data/training_data.jsonl") -> None:
-    """
-    Append a training example to the JSONL file in the required structure.
-    """
-    # Format the assistant's response as a readable string
-    response_lines = [
-        f"Name: {assistant_response.get('name', '')}",
-        f"College: {assistant_response.get('college', '')}",
-        f"High School: {assistant_response.get('high_school', '')}",
-        f"Hometown: {assistant_response.get('hometown', '')}",
-        f"Swimmer: {assistant_response.get('swimmer', '')}",
-        f"Score: {assistant_response.get('score', '')}",
-        f"Match Confidence: {assistant_response.get('match_confidence', '')}"
-    ]
-    assistant_content = "\n" + "\n".join(response_lines)
-    entry = {
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message},
-            {"role": "assistant", "content": assistant_content}
-        ]
-    }
-    with open(jsonl_path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    results = [_agent_cache_get(info) for info in runner_infos]
+    misses = [i for i, result in enumerate(results) if result is None]
+    if len(misses) < len(results):
+        print(f"Agent cache: {len(results) - len(misses)} hit(s), {len(misses)} miss(es)")
+    if not misses:
+        return results
+    from azure.ai.agents.aio import AgentsClient
+    sem = asyncio.Semaphore(MAX_CONCURRENT_AGENT_RUNS)
+    project_endpoint = os.environ["PROJECT_ENDPOINT"]  # Ensure the PROJECT_ENDPOINT environment variable is set
+    async with azure_credential(aio=True) as credential, AgentsClient(
+        endpoint=project_endpoint,
+        credential=credential,
+    ) as agents_client:
+        async def bounded(runner_info: str):
+            async with sem:
+                return await use_agent(agents_client, runner_info)
+        fresh = await asyncio.gather(*(bounded(runner_infos[i]) for i in misses), return_exceptions=True)
+    for i, result in zip(misses, fresh):
+        results[i] = result
+        # only parsed answers are cached; failed runs are retried next time
+        if isinstance(result, AgentOutput):
+            _agent_cache_put(runner_infos[i], result)
+    return results
 
 def main():
-
+    print_db_target()
     with open("etl/system_prompt.txt", "r", encoding="utf-8") as f:
         instructions = f.read().strip()
     
-    processed = 0
     max_batch = 10
-    while processed < max_batch:
-        next_runner = get_next_runner_id()
-        if next_runner != -1:
-            print(f"Processing runner: {next_runner}")
-            # Build user message for training data
-            session = get_db_session()
-            runner = session.query(Runner).filter(Runner.runner_id == next_runner).first()
-            user_message = f"{runner.first_name} {runner.last_name}, {runner.college_team}"
-            agent_output = use_agent(next_runner)
-            if agent_output:
-                try:
-                    update_runner_with_agent_output(next_runner, agent_output)
-                    print(f"AI Agent Response: {agent_output}")
-                    # Save to training data
-                    append_training_example(instructions, user_message, agent_output)
-                except Exception as e:
-                    print(f"Could not parse agent output: {e}")
-            else:
-                print("No agent response.")
-            processed += 1
-            if processed < max_batch:
-                print("Waiting 40 seconds before next runner...")
-                time.sleep(50)
-        else:
+    # One session for the whole run instead of a checkout per helper call
+    with session_scope() as session:
+        reset = reset_in_flight(session)
+        if reset:
+            print(f"Requeued {reset} runner(s) left in flight by an interrupted run")
+        # Fetch every pending runner up front, then run the agent for all of them at once
+        runners = select_pending_runners(session, max_batch)
+        if not runners:
             print("No runners to process. Exiting.")
-            break
-    print(f"Batch complete. Processed {processed} runner(s).")
+            return
+        mark_in_flight(session, [runner.runner_id for runner in runners])
+        user_messages = [f"{runner.first_name} {runner.last_name}, {runner.college_team}" for runner in runners]
+        print(f"Processing {len(runners)} runner(s) with up to {MAX_CONCURRENT_AGENT_RUNS} concurrent agent runs")
+        agent_outputs = asyncio.run(use_agent_many(user_messages))
+        updates = []
+        examples = []
+        failed: Dict[int, str] = {}
+        for runner, user_message, agent_output in zip(runners, user_messages, agent_outputs):
+            if isinstance(agent_output, Exception):
+                print(f"Agent run failed for runner {runner.runner_id}: {agent_output}")
+                failed[runner.runner_id] = str(agent_output)
+            else:
+                updates.append(agent_output.runner_update(runner.runner_id))
+                print(f"AI Agent Response: {agent_output}")
+                # Save to training data
+                examples.append(training_example(instructions, user_message, agent_output))
+        # Checkpoint the batch: successes are done, failures are retried up to
+        # MAX_AGENT_ATTEMPTS times across runs and then parked as failed
+        if not bulk_update_runners(session, updates):
+            failed.update((row["runner_id"], "could not store agent output") for row in updates)
+            # these runners are retried, so their examples are written by the run that stores them
+            updates = []
+            examples = []
+        finish_agent_runs(session, [row["runner_id"] for row in updates], failed)
+        append_training_examples(examples)
+    print(f"Batch complete. Processed {len(runners)} runner(s).")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -2,20 +2,26 @@
 """Quick database check script."""
 
 from db.db_connection import get_engine
-from db.models import Runner, Swimmer, TimeStandard
-from sqlalchemy.orm import Session
+from db.models import Classification, Runner, TimeStandard
+from sqlalchemy import func, select
+
+
+def _count(model):
+    return select(func.count()).select_from(model).scalar_subquery()
+
 
 def main():
     engine = get_engine()
-    with Session(engine) as session:
-        runner_count = session.query(Runner).count()
-        swimmer_count = session.query(Swimmer).count()
-        standards_count = session.query(TimeStandard).count()
+    # One round-trip: SELECT (SELECT count(*) ...), (SELECT count(*) ...), ...
+    stmt = select(_count(Runner), _count(TimeStandard), _count(Classification))
+    # Plain Core connection: no ORM session, identity map or autoflush for read-only counts
+    with engine.connect() as conn:
+        runner_count, standards_count, classification_count = conn.execute(stmt).one()
         
         print(f"Current database state:")
         print(f"  Runners: {runner_count}")
-        print(f"  Swimmers: {swimmer_count}")
         print(f"  Time Standards: {standards_count}")
+        print(f"  Classifications: {classification_count}")
 
 if __name__ == "__main__":
     main()